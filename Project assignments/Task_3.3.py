@@ -1,7 +1,8 @@
 from machine import Pin, I2C
 from ssd1306 import SSD1306_I2C
 from fifo import Fifo
-from filefifo import Filefifo
+from capture import TextCapture # PulsePro/capture.py (needs recording.py and hal.py on the Pico too)
+from waveform import Waveform # PulsePro/waveform.py
 import micropython
 import time
 
@@ -28,32 +29,20 @@ class Encoder:
 i2c = I2C(1, scl=Pin(15), sda=Pin(14), freq=400000)
 oled = SSD1306_I2C(128, 64, i2c)
 rot = Encoder(10, 11, 12)
-data_reader = Filefifo(10, name='capture_250Hz_02.txt') #use filefifo to read the values 
+capture = TextCapture('capture_250Hz_02.txt') # reads windows of the file when needed, the whole capture can be viewed
+viewer = Waveform(oled, capture) # min/max bars, any zoom level is drawn from 128 values
 
-data = [data_reader.get() for _ in range(1000)] # read 1000 data points from the capture-02 file
-minimum, maximum = min(data), max(data)
-
-def scale_data(value, min_val, max_val): # function to scale the data to fit within the OLED display
-    return int(((value - min_val) / (max_val - min_val)) * 63)
-
-samples = [scale_data(val, minimum, maximum) for val in data]
-
-def display_samples(samples, display_position):
-    oled.fill(0) # clear display
-    for pixel_index in range(128): #iterate through samples based on oled screen
-        sample_index = pixel_index + display_position
-        if sample_index < len(samples):
-            oled.pixel(pixel_index, 63 - samples[sample_index], 1)
-    oled.show()
-
-current_position, max_position = 0, len(samples) - 128
+# Turning the encoder scrolls, pressing it switches between scrolling and zooming
+zooming = False
 
 while True:
     while rot.fifo.has_data():
         encoder_value = rot.fifo.get()
-        if encoder_value == 1 and current_position < max_position: # if the encoder is rotated clockwise and there is space to move to the right
-            #it increments the current_position var
-            current_position += 5
-        elif encoder_value == -1 and current_position > 0: # counter clockwise
-            current_position -= 5
-    display_samples(samples, current_position)
+        if encoder_value == 0:
+            zooming = not zooming
+        elif zooming: # clockwise zooms out, counter clockwise zooms in
+            viewer.set_zoom(viewer.zoom + encoder_value)
+        else: # moves 5 pixel columns at a time
+            viewer.scroll(5 * encoder_value)
+    viewer.draw() # only draws when the view has changed
+    time.sleep_ms(10)
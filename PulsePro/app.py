@@ -0,0 +1,194 @@
+import time
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+from menu import (measure_screen, exit_screen, sending_screen, sent_screen,
+                  no_connection_screen, send_failed_screen)
+
+# PulsePro user interface and measurement as cooperative asyncio tasks.
+#   ui        menus and screens, waits for the encoder and buttons
+#   detect    runs while measuring, moves samples from the sampler Fifo
+#             (filled by the timer interrupt) through the peak detector
+#   sender    sends finished results to the server
+# Every wait is an await, so while one task waits the others run and the CPU
+# idles instead of spinning on pin values.
+
+POLL_MS = 10 # how often buttons and the encoder Fifo are checked
+DETECT_MS = 20 # how often the sample Fifo is emptied while measuring
+
+
+def wait_ms(ms):
+    # asyncio.sleep_ms only exists on MicroPython
+    if hasattr(asyncio, "sleep_ms"):
+        return asyncio.sleep_ms(ms)
+    return asyncio.sleep(ms / 1000)
+
+
+class PulsePro:
+    def __init__(self, oled, encoder, on_btn, back_btn, menu, heart_rate, hrv_data, hrv_stats, send, freq=None):
+        self.oled = oled
+        self.encoder = encoder
+        self.on_btn = on_btn
+        self.back_btn = back_btn
+        self.menu = menu
+        self.heart_rate = heart_rate
+        self.hrv_data = hrv_data
+        self.hrv_stats = hrv_stats
+        self.send = send # await send(stats) -> True sent, False send failed, None no connection
+        self.freq = freq # freq.FrequencyHRV for the "Kubios HRV" option, or a function that makes one when first used
+        self.measuring = False
+        self.result = None # result waiting for the sender task
+        self.send_status = None
+        self.send_request = asyncio.Event()
+        self.send_done = asyncio.Event()
+
+    # Waiting for input
+
+    async def wait_press(self, *pins):
+        # Waits until one of the pins is pressed (goes low), returns that pin.
+        # A button that is still held from before has to be released first.
+        while any(pin.value() == 0 for pin in pins):
+            await wait_ms(POLL_MS)
+        while True:
+            for pin in pins:
+                if pin.value() == 0:
+                    return pin
+            await wait_ms(POLL_MS)
+
+    async def choose(self):
+        # Menu, the encoder moves the arrow and a press selects the option
+        encoder = self.encoder
+        encoder.read() # drop turns and presses from before the menu
+        encoder.Menu_State = True
+        self.menu.update()
+        while True:
+            delta, presses = encoder.read()
+            moved = delta != 0
+            while delta > 0:
+                self.menu.next_opt()
+                delta -= 1
+            while delta < 0:
+                self.menu.prev_opt()
+                delta += 1
+            if presses:
+                encoder.Menu_State = False
+                self.menu.toggle_opt()
+                option = self.menu.options_state
+                self.menu.options_state = ""
+                return option
+            if moved:
+                self.menu.update() # one redraw for all the turns since the last check
+            await wait_ms(POLL_MS)
+
+    # Tasks
+
+    async def detect(self):
+        hr = self.heart_rate
+        hr.start()
+        while self.measuring:
+            hr.process()
+            await wait_ms(DETECT_MS)
+        hr.stop()
+
+    async def sender(self):
+        while True:
+            await self.send_request.wait()
+            self.send_request.clear()
+            try:
+                self.send_status = await self.send(self.result)
+            except Exception as e:
+                print("Error sending info:", e)
+                self.send_status = False
+            self.send_done.set()
+
+    async def measure_hrv(self, kubios=False):
+        # kubios=True adds the frequency domain values (LF, HF) computed here
+        self.menu.Press_Start()
+        await wait_ms(500)
+        await self.wait_press(self.encoder.pin_sw)
+        await wait_ms(1000)
+        self.menu.show(measure_screen)
+
+        self.measuring = True
+        task = asyncio.create_task(self.detect())
+        pin = await self.wait_press(self.encoder.pin_sw, self.back_btn)
+        self.measuring = False
+        await task
+        if pin is self.back_btn:
+            self.heart_rate.ppi.clear()
+            self.hrv_stats.reset()
+            await wait_ms(1000)
+            return
+
+        stats = self.hrv_stats.snapshot()
+        dropped = self.heart_rate.dropped
+        stats['dropped'] = dropped # not 0: the detector missed samples, some intervals are wrong
+        stats['time'] = int(time.time()) # when it was measured, a result sent later from the outbox keeps it
+        if dropped:
+            print("Samples lost while measuring:", dropped)
+        if kubios and callable(self.freq):
+            self.freq = self.freq()
+        freq = None
+        if kubios and self.freq is not None:
+            freq = self.freq.analyse(self.heart_rate.ppi.values())
+        self.oled.fill(0)
+        self.hrv_data.display_HRV_values(stats['mean_ppi'], stats['mean_hr'], stats['sdnn'], stats['rmssd'])
+        if dropped:
+            self.oled.text("Samples lost!", 0, 56, 1)
+        self.oled.show()
+        self.heart_rate.ppi.clear()
+        self.hrv_stats.reset()
+        await wait_ms(750)
+        await self.wait_press(self.encoder.pin_sw)
+        if kubios and self.freq is not None:
+            self.oled.fill(0)
+            self.hrv_data.display_frequency_values(freq)
+            self.oled.show()
+            if freq is not None:
+                stats.update(freq) # sent with the time domain values
+            await wait_ms(750)
+            await self.wait_press(self.encoder.pin_sw)
+
+        self.menu.show(sending_screen)
+        self.result = stats
+        self.send_done.clear()
+        self.send_request.set()
+        await self.send_done.wait()
+        if self.send_status:
+            self.menu.show(sent_screen)
+        elif self.send_status is None: # saved in the outbox, sent when connected
+            self.menu.show(no_connection_screen)
+        else:
+            self.menu.show(send_failed_screen)
+        await wait_ms(2000)
+
+    async def confirm_exit(self):
+        # True if the device should turn off
+        self.menu.show(exit_screen)
+        pin = await self.wait_press(self.on_btn, self.back_btn)
+        if pin is self.back_btn:
+            return False
+        self.menu.GoodBye()
+        await wait_ms(2000)
+        self.menu.Power_Off()
+        return True
+
+    async def ui(self):
+        while True:
+            await self.wait_press(self.on_btn, self.back_btn) # device is "off"
+            self.menu.Welcome_Text()
+            await wait_ms(3000)
+            self.menu.current_row = 0 # arrow on the first option
+            while True:
+                option = await self.choose()
+                if option == "HRV":
+                    await self.measure_hrv()
+                elif option == "Kubios HRV":
+                    await self.measure_hrv(kubios=True)
+                elif option == "Exit" and await self.confirm_exit():
+                    break
+
+    async def run(self):
+        asyncio.create_task(self.sender())
+        await self.ui()
@@ -0,0 +1,168 @@
+import struct
+from array import array
+from recording import HEADER_SIZE, read_header, MAGIC, VERSION, HEADER
+
+# Readers for long PPG captures that don't load the whole file into RAM.
+#   TextCapture    one value per line, like capture_250Hz_01.txt
+#   BinaryCapture  a recording from recording.py (uint16 after a header)
+# Opening a capture reads it once to find the min/max of every block of
+# `block` samples (and for text files where each block starts), after that
+# window(start, count) reads only the samples asked for into a preallocated
+# buffer and returns a memoryview of it, no new lists or arrays. The view is
+# only valid until the next window() call.
+# 5 min at 250 Hz is 300 blocks of 250 samples, about 2 KB of index.
+# convert() turns a text capture into the binary format, which is faster to
+# read because a window is one seek and one readinto().
+
+
+class Capture:
+    def __init__(self, block=250, size=512):
+        self.block = block # samples per min/max block
+        self.buf = array('H', bytes(2 * max(size, block))) # window buffer
+        self.view = memoryview(self.buf)
+        self.count = 0
+        self.block_min = array('H')
+        self.block_max = array('H')
+
+    def __len__(self):
+        return self.count
+
+    def add_block(self, low, high):
+        self.block_min.append(low)
+        self.block_max.append(high)
+
+    def window(self, start, count):
+        # Samples start..start+count (fewer at the end of the file) as a memoryview
+        start = max(0, min(start, self.count))
+        count = max(0, min(count, self.count - start, len(self.buf)))
+        return self.read(start, count)
+
+    def min_max(self, start=0, end=None):
+        # Smallest and largest sample in start..end, whole blocks come from the index
+        if end is None or end > self.count:
+            end = self.count
+        low = 0xFFFF
+        high = 0
+        i = start
+        while i < end:
+            b = i // self.block
+            if i % self.block == 0 and i + self.block <= end:
+                low = min(low, self.block_min[b])
+                high = max(high, self.block_max[b])
+                i += self.block
+            else:
+                values = self.window(i, min(end, (b + 1) * self.block) - i)
+                for value in values:
+                    if value < low:
+                        low = value
+                    if value > high:
+                        high = value
+                i += len(values)
+        return low, high
+
+    def close(self):
+        self.file.close()
+
+
+class TextCapture(Capture):
+    def __init__(self, name, block=250, size=512):
+        super().__init__(block, size)
+        self.file = open(name)
+        self.offsets = array('I') # file position of the first line of every block
+        low = 0xFFFF
+        high = 0
+        pos = self.file.tell()
+        line = self.file.readline()
+        while line:
+            line = line.strip()
+            if line:
+                if self.count % block == 0:
+                    if self.count:
+                        self.add_block(low, high)
+                        low = 0xFFFF
+                        high = 0
+                    self.offsets.append(pos)
+                value = int(line)
+                if value < low:
+                    low = value
+                if value > high:
+                    high = value
+                self.count += 1
+            pos = self.file.tell()
+            line = self.file.readline()
+        if self.count:
+            self.add_block(low, high)
+
+    def read(self, start, count):
+        f = self.file
+        if count:
+            f.seek(self.offsets[start // self.block])
+        skip = start % self.block
+        n = 0
+        while n < count:
+            line = f.readline().strip()
+            if not line:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            self.buf[n] = int(line)
+            n += 1
+        return self.view[:count]
+
+
+class BinaryCapture(Capture):
+    def __init__(self, name, block=250, size=512):
+        super().__init__(block, size)
+        info = read_header(name)
+        self.rate = info["rate"]
+        self.count = info["count"]
+        self.offset = info["offset"]
+        self.file = open(name, "rb")
+        start = 0
+        while start < self.count:
+            values = self.read(start, min(block, self.count - start))
+            low = 0xFFFF
+            high = 0
+            for value in values:
+                if value < low:
+                    low = value
+                if value > high:
+                    high = value
+            self.add_block(low, high)
+            start += block
+
+    def read(self, start, count):
+        view = self.view[:count]
+        self.file.seek(self.offset + 2 * start)
+        self.file.readinto(view)
+        return view
+
+
+def convert(text_name, binary_name, rate=250):
+    # Text capture to the binary recording format, returns the sample count
+    header = bytearray(HEADER_SIZE)
+    chunk = array('H', bytes(1024))
+    count = 0
+    n = 0
+    with open(text_name) as src, open(binary_name, "wb") as dst:
+        dst.write(header)
+        while True:
+            line = src.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            chunk[n] = int(line)
+            n += 1
+            count += 1
+            if n == len(chunk):
+                dst.write(chunk)
+                n = 0
+        if n:
+            dst.write(memoryview(chunk)[:n])
+        struct.pack_into(HEADER, header, 0, MAGIC, VERSION, rate, 0, 0, count * 1000 // rate, count, 0)
+        dst.seek(0)
+        dst.write(header)
+    return count
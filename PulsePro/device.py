@@ -0,0 +1,138 @@
+from hal import ADC, Pin, I2C, Led, ticks_ms
+import gc
+import micropython
+from sampler import Sampler
+from ppi import PPIStore
+from hrv import HRVData, HRVAccumulator
+from encoder import RotaryEncoder
+import menu
+from menu import MenuDisplay
+from screens import ScreenCache
+from heart_rate import HeartRateDetector
+from display import Display
+from app import PulsePro, asyncio, wait_ms
+from plot import LivePlot
+import tracing
+
+# The PulsePro device: settings, hardware and the tasks. main.py only imports
+# this, so it can be precompiled to device.mpy with the other modules
+# (tools/build_mpy.py) instead of being compiled from source on every boot.
+# Only what the menu needs is made before it's up. The network stack (WLAN,
+# MQTT, outbox) is imported and started right after, and the recording, dual
+# core and LF/HF modules only when they are turned on or first used.
+
+micropython.alloc_emergency_exception_buf(200)
+
+SAMPLE_RATE = 250 # Hz, same rate as the capture_250Hz recordings
+WINDOW_MS = 3900 # a window without a BPM is extended by this much, up to MAX_WINDOW_MS
+MAX_WINDOW_MS = 11700
+BEATS = 3 # regular beat to beat intervals that end a window with a BPM
+RECORD = False # True: save the raw samples of every measurement in rec/
+DUAL_CORE = False # True: sampling and peak detection on core 1, UI and network on core 0
+REPLAY = None # name of a recording (e.g. "rec/0001.ppg") to measure from instead of the sensor
+BOOT_REPORT = True # print the time from reset to the menu and the heap use then
+TRACE = False # True: time the screen updates, detection and MQTT (tracing.py), sent after every result
+
+# MQTT
+
+SSID = "KMD658_Group_8"
+PASSWORD = "27448052"
+BROKER_IP = "192.168.8.253"
+TOPIC = "HRV_Info"
+KEEPALIVE = 60 # s
+
+WLAN_DEADLINE = 3000 # ms to wait for the WLAN when sending
+
+wlan = None # made by start_network()
+mqtt = None
+outbox = None
+
+def start_network():
+    # Imported here and not at the top, so booting to the menu doesn't wait for them
+    global wlan, mqtt, outbox
+    import network
+    from umqtt.simple import MQTTClient
+    from net import WlanManager, MQTTLink
+    from outbox import Outbox
+
+    wlan = WlanManager(network.WLAN(network.STA_IF), SSID, PASSWORD) # joins in the background
+
+    def make_mqtt_client():
+        return MQTTClient("", BROKER_IP, keepalive=KEEPALIVE)
+
+    mqtt = MQTTLink(make_mqtt_client, TOPIC, KEEPALIVE, wlan.is_ready, is_measuring) # stays connected between measurements
+    outbox = Outbox("outbox.bin") # results waiting to be sent, kept on flash
+    asyncio.create_task(wlan.run()) # joins the WLAN and keeps it up
+    asyncio.create_task(mqtt.run()) # keepalive and reconnect in the background
+    asyncio.create_task(outbox.run(mqtt)) # sends saved results when connected
+
+def is_measuring():
+    return app.measuring
+
+async def send_data(stats):
+    # Returns True when sent, False if sending failed, None if there was no connection.
+    # Results that weren't sent go to the outbox and are sent later.
+    if wlan is None:
+        start_network()
+    status = None
+    if await wlan.ready(WLAN_DEADLINE):
+        status = mqtt.send_result(stats)
+    if not status:
+        outbox.append(stats)
+    elif TRACE:
+        tracing.publish(mqtt) # topic HRV_Trace, for tools/trace_hist.py
+        tracing.clear()
+    return status
+
+def make_freq():
+    from freq import FrequencyHRV
+    return FrequencyHRV() # LF/HF for the Kubios option, buffers for 128 s
+
+if TRACE:
+    tracing.enable(512)
+
+i2c = I2C(1, scl=Pin(15), sda=Pin(14), freq=400000)
+oled = Display(128, 64, i2c) # only sends the changed parts of the screen
+encoder = RotaryEncoder(10, 11, 12, 300)
+On_btn = Pin(7,Pin.IN, Pin.PULL_UP)
+back_btn= Pin(9,Pin.IN, Pin.PULL_UP)
+led_onboard = Pin("LED", Pin.OUT)
+led_onboard.off()
+led = Led(22)
+adc = ADC(0)
+if REPLAY:
+    from recording import Replay
+    sampler = Replay(REPLAY) # same samples at the same rate as when recorded
+else:
+    sampler = Sampler(adc, SAMPLE_RATE) # timer driven ADC sampling
+recorder = None
+if RECORD and not REPLAY:
+    from recording import Recorder
+    recorder = Recorder("rec", SAMPLE_RATE)
+
+PPI = PPIStore(SAMPLE_RATE) # Peak to peak intervals in ms
+HRV_stats = HRVAccumulator() # HRV values updated on every beat
+
+screens = ScreenCache(oled, "screens.bin", menu.__file__) # static screens, drawn once and kept on flash until menu changes
+menu_display = MenuDisplay(oled, led_onboard, screens) # class of display
+live_plot = LivePlot(oled, 0, 24, 128, 16) # filtered signal between the BPM and the help text
+run_heart_rate_detector = HeartRateDetector(oled, sampler, PPI, HRV_stats, WINDOW_MS, recorder, live_plot, BEATS, MAX_WINDOW_MS) # variable of class to run heart rate detection
+if DUAL_CORE:
+    from dualcore import DualCoreDetector
+    run_heart_rate_detector = DualCoreDetector(run_heart_rate_detector) # same interface, runs on core 1
+HRV_values = HRVData(oled) # variable of class of HRV data
+
+app = PulsePro(oled, encoder, On_btn, back_btn, menu_display, run_heart_rate_detector, HRV_values, HRV_stats, send_data, make_freq)
+
+async def main():
+    ui = asyncio.create_task(app.run())
+    await wait_ms(0) # the UI runs to its first wait, the buttons work from here on
+    if BOOT_REPORT:
+        gc.collect()
+        print("Ready %d ms after reset, heap %d bytes used, %d free" % (ticks_ms(), gc.mem_alloc(), gc.mem_free()))
+    if wlan is None:
+        start_network()
+    await ui
+
+def run():
+    asyncio.run(main())
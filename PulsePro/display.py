@@ -0,0 +1,150 @@
+from hal import SSD1306_I2C, ticks_us
+import tracing
+
+# SSD1306 driver that only sends what changed.
+# Every drawing call marks the columns it touched on each 8 pixel page, and
+# show() sends only those parts of the framebuffer instead of the whole 1 KB.
+# Any number of drawing calls between two show() calls go out in one update.
+
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+
+
+class Display(SSD1306_I2C):
+    def __init__(self, width, height, i2c, addr=0x3C):
+        # The driver's constructor already calls fill(0) and show() (init_display),
+        # so everything they use has to exist before it runs
+        pages = height // 8
+        self.dirty_x0 = bytearray(pages) # first changed column of each page
+        self.dirty_x1 = bytearray(pages) # last changed column of each page
+        self.cmd = bytearray(7) # control byte 0x00 + column and page address commands
+        super().__init__(width, height, i2c, addr) # fill(0) marks everything, show() sends it
+
+    def mark(self, x, y, w, h):
+        x0 = max(x, 0)
+        x1 = min(x + w, self.width) - 1
+        y0 = max(y, 0)
+        y1 = min(y + h, self.height) - 1
+        if x0 > x1 or y0 > y1:
+            return
+        for page in range(y0 >> 3, (y1 >> 3) + 1):
+            if self.dirty_x0[page] > x0:
+                self.dirty_x0[page] = x0
+            if self.dirty_x1[page] < x1:
+                self.dirty_x1[page] = x1
+
+    def mark_all(self):
+        for page in range(self.pages):
+            self.dirty_x0[page] = 0
+            self.dirty_x1[page] = self.width - 1
+
+    def clean(self):
+        for page in range(self.pages):
+            self.dirty_x0[page] = 0xFF
+            self.dirty_x1[page] = 0
+
+    def is_dirty(self):
+        for page in range(self.pages):
+            if self.dirty_x0[page] <= self.dirty_x1[page]:
+                return True
+        return False
+
+    # Drawing, same as framebuf but remembers the changed area
+
+    def fill(self, c):
+        super().fill(c)
+        self.mark_all()
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            return super().pixel(x, y)
+        super().pixel(x, y, c)
+        self.mark(x, y, 1, 1)
+
+    def fill_rect(self, x, y, w, h, c):
+        super().fill_rect(x, y, w, h, c)
+        self.mark(x, y, w, h)
+
+    def rect(self, x, y, w, h, c, f=False):
+        super().rect(x, y, w, h, c, f)
+        self.mark(x, y, w, h)
+
+    def hline(self, x, y, w, c):
+        super().hline(x, y, w, c)
+        self.mark(x, y, w, 1)
+
+    def vline(self, x, y, h, c):
+        super().vline(x, y, h, c)
+        self.mark(x, y, 1, h)
+
+    def line(self, x1, y1, x2, y2, c):
+        super().line(x1, y1, x2, y2, c)
+        self.mark(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
+    def text(self, s, x, y, c=1):
+        super().text(s, x, y, c)
+        self.mark(x, y, 8 * len(s), 8)
+
+    def scroll(self, dx, dy):
+        super().scroll(dx, dy)
+        self.mark_all()
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        # framebuf objects don't know their size, so the whole screen is marked
+        super().blit(fbuf, x, y, key, palette)
+        self.mark_all()
+
+    def blit_area(self, fbuf, x, y, w, h, key=-1):
+        # Same as blit() for a w x h framebuf, marks only where it went
+        super().blit(fbuf, x, y, key)
+        self.mark(x, y, w, h)
+
+    def load(self, buf):
+        # Copies a whole screen (screens.py) into the buffer, marks it only if it's different
+        if self.buffer != buf:
+            self.buffer[:] = buf
+            self.mark_all()
+
+    # Sending
+
+    def show(self):
+        if tracing.on:
+            t0 = ticks_us()
+        page = 0
+        while page < self.pages:
+            x0 = self.dirty_x0[page]
+            x1 = self.dirty_x1[page]
+            if x0 > x1:
+                page += 1
+                continue
+            last = page
+            if x0 == 0 and x1 == self.width - 1:
+                # Full width pages next to each other are one block in the buffer
+                while (last + 1 < self.pages and self.dirty_x0[last + 1] == 0
+                       and self.dirty_x1[last + 1] == self.width - 1):
+                    last += 1
+            self.send(page, last, x0, x1)
+            page = last + 1
+        self.clean()
+        if tracing.on:
+            tracing.span(tracing.SHOW, t0)
+
+    def send(self, page0, page1, x0, x1):
+        cmd = self.cmd
+        cmd[0] = 0x00 # the rest of the bytes are commands
+        cmd[1] = SET_COL_ADDR
+        cmd[2] = x0
+        cmd[3] = x1
+        cmd[4] = SET_PAGE_ADDR
+        cmd[5] = page0
+        cmd[6] = page1
+        self.i2c.writeto(self.addr, cmd)
+        start = page0 * self.width
+        if page0 == page1:
+            self.write_data(memoryview(self.buffer)[start + x0:start + x1 + 1])
+        else:
+            self.write_data(memoryview(self.buffer)[start:(page1 + 1) * self.width])
+
+    def show_all(self):
+        self.mark_all()
+        self.show()
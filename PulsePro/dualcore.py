@@ -0,0 +1,215 @@
+import _thread
+from array import array
+from hal import sleep_ms, ticks_us
+import tracing
+
+# Dual core measurement for the RP2040.
+# Core 1 (a _thread) starts the sampler, so the timer interrupt runs on core 1
+# too, and runs the filter and the peak detector. Core 0 keeps the UI, the
+# OLED, the encoder and the WLAN/MQTT tasks. A blocking I2C transfer or
+# network call on core 0 no longer delays sampling or detection, it only
+# delays when the results are shown.
+#
+# The cores talk through SharedRing, a single producer / single consumer ring
+# of (kind, a, b, c) records in a preallocated array. Core 1 only writes
+# `tail` and core 0 only writes `head`, and a record is written before `tail`
+# is moved past it, so no lock is needed. Records:
+#   RAW      a = raw sample, for the recorder (flash is only written on core 0)
+#   SAMPLE   a = filtered sample, for the live plot, left out when the ring is
+#            getting full so that peaks are never dropped
+#   COUNT    a = samples, b = clipped samples since the last COUNT, comes
+#            before every PEAK and WINDOW
+#   PEAK     a = peak's sample index, b = detector index, c = envelope span
+#   WINDOW   a = detector index, b = envelope span, the window's time is up
+# What the peaks and time ups mean (signal quality, BPM, the next window) is
+# decided on core 0 by the HeartRateDetector, from the records only: the
+# detector and the counts of clipped samples belong to core 1, the
+# HeartRateDetector and its SignalQuality to core 0. The only thing going the
+# other way is the end of the window, which core 0 writes into a one word
+# array (`window_end`) and core 1 reads.
+#
+# DualCoreDetector has the start()/process()/stop() of HeartRateDetector, so
+# the app doesn't know which one it has.
+
+RAW = 0
+SAMPLE = 1
+PEAK = 2
+WINDOW = 3
+COUNT = 4
+
+
+class SharedRing:
+    def __init__(self, size=1024):
+        self.size = size # records, 16 bytes each
+        self.data = array('i', bytes(16 * size))
+        self.head = 0 # next record to read, only changed by the consumer
+        self.tail = 0 # next record to write, only changed by the producer
+        self.dropped = 0
+
+    def free(self):
+        return (self.head - self.tail - 1) % self.size
+
+    def put(self, kind, a=0, b=0, c=0):
+        tail = self.tail
+        next_tail = tail + 1 if tail + 1 < self.size else 0
+        if next_tail == self.head:
+            self.dropped += 1
+            return False
+        i = tail << 2
+        self.data[i] = kind
+        self.data[i + 1] = a
+        self.data[i + 2] = b
+        self.data[i + 3] = c
+        self.tail = next_tail # the record is complete before the consumer can see it
+        return True
+
+    def has_data(self):
+        return self.head != self.tail
+
+    def peek(self):
+        # Offset of the oldest record in data, call advance() when done with it
+        return self.head << 2
+
+    def advance(self):
+        head = self.head + 1
+        self.head = head if head < self.size else 0
+
+    def clear(self):
+        self.head = self.tail
+
+
+class DualCoreDetector:
+    def __init__(self, hr, ring_size=1024, idle_ms=2, plot_reserve=64):
+        self.hr = hr # HeartRateDetector, its filter, detector and sampler run on core 1
+        self.ppi = hr.ppi
+        self.sampler = hr.sampler
+        self.ring = SharedRing(ring_size) # 1024 records: > 2 s of raw and filtered samples
+        self.window_end = array('i', bytes(4)) # hr.window_end for core 1, one word store
+        self.idle_ms = idle_ms # core 1 sleeps this long when the sampler Fifo is empty
+        self.plot_reserve = plot_reserve # free records kept for peaks when the ring fills up
+        self.running = False # set by core 0, core 1 stops when it goes False
+        self.stopped = True # set by core 1 when it has stopped
+        self.dropped = 0 # samples lost in the last measurement, see HeartRateDetector
+
+    def start(self):
+        if self.running:
+            self.stop()
+        if not self.stopped:
+            # Core 1 didn't stop last time, a second thread can't be started.
+            # Nothing is measured, process() finds nothing and the app goes on.
+            print("Core 1 is still running, not measuring")
+            self.hr.show_status("Core 1 busy")
+            return
+        self.hr.prepare() # state is reset on core 0 before core 1 starts using it
+        self.window_end[0] = self.hr.window_end
+        self.ring.clear()
+        self.running = True
+        self.stopped = False
+        _thread.start_new_thread(self.worker, ())
+
+    def worker(self):
+        # Runs on core 1
+        hr = self.hr
+        ring = self.ring
+        sampler = self.sampler
+        signal_filter = hr.filter
+        detector = hr.detector
+        window_ends = self.window_end
+        clip_low = hr.quality.clip_low
+        clip_high = hr.quality.clip_high
+        samples = 0 # not sent in a COUNT record yet
+        clipped = 0
+        record = hr.recorder is not None
+        plot = hr.plot is not None
+        sent_end = -1 # window_end a WINDOW record was sent for
+        sampler.start()
+        try:
+            while self.running:
+                if not sampler.has_data():
+                    sleep_ms(self.idle_ms)
+                    continue
+                while sampler.has_data():
+                    value = sampler.get()
+                    if value is None: # a replayed recording ended early
+                        break
+                    samples += 1
+                    if value <= clip_low or value >= clip_high:
+                        clipped += 1
+                    if record:
+                        ring.put(RAW, value)
+                    value = signal_filter.add(value)
+                    if plot and ring.free() > self.plot_reserve:
+                        ring.put(SAMPLE, value)
+                    peak = detector.add(value)
+                    index = detector.index
+                    window_end = window_ends[0]
+                    timeout = index + 1 >= window_end and window_end != sent_end
+                    if (peak >= 0 or timeout) and ring.put(COUNT, samples, clipped):
+                        samples = 0
+                        clipped = 0
+                    if peak >= 0:
+                        ring.put(PEAK, peak, index, detector.high - detector.low)
+                    if timeout:
+                        ring.put(WINDOW, index, detector.high - detector.low)
+                        sent_end = window_end
+        finally:
+            sampler.stop()
+            self.stopped = True
+
+    def process(self):
+        # Runs on core 0: handles what core 1 found, True when a window ended
+        if tracing.on:
+            t0 = ticks_us()
+        hr = self.hr
+        ring = self.ring
+        data = ring.data
+        done = False
+        while ring.has_data():
+            i = ring.peek()
+            kind = data[i]
+            if kind == RAW:
+                hr.recorder.add(data[i + 1])
+            elif kind == SAMPLE:
+                hr.plot.add(data[i + 1])
+            elif kind == COUNT:
+                hr.quality.add_counts(data[i + 1], data[i + 2])
+            elif kind == PEAK:
+                done = hr.add_peak(data[i + 1], data[i + 2], data[i + 3])
+            elif data[i + 1] + 1 >= hr.window_end: # WINDOW, not if a BPM already ended the window
+                done = hr.window_timeout(data[i + 1], data[i + 2])
+            ring.advance()
+            if done:
+                break
+        self.window_end[0] = hr.window_end
+        if hr.plot is not None:
+            hr.plot.show()
+        if tracing.on:
+            tracing.span(tracing.PROCESS, t0)
+        return done
+
+    def stop(self, timeout_ms=1000):
+        # Waits for core 1 to stop, start() won't start a new thread before it has.
+        # An exception here would end the UI task, so a core 1 that doesn't stop
+        # is only reported and the ring is left to it.
+        self.running = False
+        while not self.stopped and timeout_ms > 0:
+            sleep_ms(1)
+            timeout_ms -= 1
+        if not self.stopped:
+            print("Core 1 did not stop")
+            return
+        self.dropped = self.sampler.dropped() - self.hr.dropped_start
+        if self.ring.dropped:
+            print("Core 1 results dropped:", self.ring.dropped)
+            self.ring.dropped = 0
+        recorder = self.hr.recorder
+        if recorder is not None:
+            # Samples core 1 read before it stopped still go to the recording
+            data = self.ring.data
+            while self.ring.has_data():
+                i = self.ring.peek()
+                if data[i] == RAW:
+                    recorder.add(data[i + 1])
+                self.ring.advance()
+            print("Recorded", recorder.stop(self.sampler.filled))
+        self.ring.clear()
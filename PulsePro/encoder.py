@@ -0,0 +1,54 @@
+from hal import Pin, ticks_us, ticks_diff, disable_irq, enable_irq
+
+# Rotary encoder with push switch.
+# The interrupt handlers only add to two counters: `delta` (+1 per clockwise
+# detent, -1 per counter clockwise one) and `presses`. Nothing is queued, so a
+# fast spin can't fill a queue and lose steps, and the menu reads everything
+# that happened since its last look with one read() call and redraws once.
+# Both handlers debounce with ticks_us timestamps: an edge on A that comes
+# less than edge_us after the edge before it is contact bounce, and so is a
+# switch edge less than min_interval ms after the one before it.
+
+
+class RotaryEncoder:
+    def __init__(self, pin_a, pin_b, pin_sw, min_interval, edge_us=1000):
+        self.pin_a = Pin(pin_a, Pin.IN, Pin.PULL_UP)
+        self.pin_b = Pin(pin_b, Pin.IN, Pin.PULL_UP)
+        self.pin_sw = Pin(pin_sw, Pin.IN, Pin.PULL_UP)
+        self.Menu_State = False # turns and presses only count while True
+        self.delta = 0 # net rotation since the last read()
+        self.presses = 0 # switch presses since the last read()
+        self.min_interval = min_interval #Min. time b/w switch presses to avoid bouncing
+        self.edge_us = edge_us # min. time between two detents
+        self.prev_press_time = ticks_us()
+        self.prev_edge_time = ticks_us()
+        self.pin_a.irq(trigger=Pin.IRQ_FALLING, handler=self.rotary_handler)
+        self.pin_sw.irq(trigger=Pin.IRQ_FALLING, handler=self.toggle_handler)
+
+    def rotary_handler(self, pin):
+        now = ticks_us()
+        elapsed = ticks_diff(now, self.prev_edge_time)
+        self.prev_edge_time = now
+        if 0 <= elapsed < self.edge_us: # < 0: last edge was so long ago that ticks wrapped
+            return
+        if self.Menu_State:
+            self.delta += 1 if self.pin_b.value() else -1
+
+    def toggle_handler(self, pin):
+        now = ticks_us()
+        elapsed = ticks_diff(now, self.prev_press_time)
+        self.prev_press_time = now
+        if 0 <= elapsed < self.min_interval * 1000:
+            return
+        if self.Menu_State:
+            self.presses += 1
+
+    def read(self):
+        # (net rotation, presses) since the last call, and starts counting again
+        state = disable_irq()
+        delta = self.delta
+        presses = self.presses
+        self.delta = 0
+        self.presses = 0
+        enable_irq(state)
+        return delta, presses
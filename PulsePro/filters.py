@@ -0,0 +1,43 @@
+import array
+
+# Filter stage between the ADC and the peak detector, integer math only.
+#   DC removal  first order IIR high-pass (y = x - x_prev + p * y_prev) with
+#               the pole p = 253/256, about 0.5 Hz at 250 Hz. Removes the
+#               baseline and the slow wander from finger pressure and breathing.
+#   low-pass    moving average of 16 samples (64 ms at 250 Hz), about 7 Hz,
+#               removes mains hum and ADC noise.
+# The output is centred on 0 and has the same scale as read_u16() values.
+
+POLE = 253 # / 256
+AVERAGE = 16 # moving average length, power of 2
+AVERAGE_SHIFT = 4
+
+
+class SignalFilter:
+    def __init__(self):
+        self.ring = array.array('i')
+        for i in range(AVERAGE):
+            self.ring.append(0)
+        self.reset()
+
+    def reset(self):
+        self.x_prev = -1 # previous input, 12 bit ADC value scaled by 256
+        self.y = 0 # high-pass output, 12 bit scaled by 256
+        self.total = 0 # sum of the values in ring
+        self.pos = 0
+        for i in range(AVERAGE):
+            self.ring[i] = 0
+
+    def add(self, value):
+        x = (value >> 4) << 8 # RP2040 ADC is 12 bit, keeps the products in small ints
+        if self.x_prev < 0:
+            self.x_prev = x # no step from 0 at the start
+        self.y = x - self.x_prev + ((self.y * POLE) >> 8)
+        self.x_prev = x
+        high = self.y >> 4 # back to the read_u16() scale
+
+        pos = self.pos
+        self.total += high - self.ring[pos]
+        self.ring[pos] = high
+        self.pos = (pos + 1) & (AVERAGE - 1)
+        return self.total >> AVERAGE_SHIFT
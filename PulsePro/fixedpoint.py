@@ -0,0 +1,39 @@
+# Integer helpers for the signal math.
+# On MicroPython every float is an object on the heap, so the per-sample and
+# per-beat math uses only integers. Small ints (up to 2^30) are not allocated,
+# the value ranges below are chosen to stay in them.
+#
+# Tolerance against the old float versions, checked on random and recorded
+# data with CPython by tools/fixedpoint_check.py:
+#   mean PPI, mean HR, pNN50   within 1 (rounding)
+#   SDNN, RMSSD                within 1 ms
+#   calculate_threshold        within 16 counts (1 step of the 12 bit ADC)
+
+
+def isqrt(n):
+    # Largest x with x * x <= n, n >= 0
+    if n < 2:
+        return n
+    x = n
+    s = 0
+    while x:
+        x >>= 2
+        s += 1
+    x = 1 << s # >= sqrt(n), Newton steps go down from here
+    while True:
+        y = (x + n // x) >> 1
+        if y >= x:
+            return x
+        x = y
+
+
+def sqrt_round(n):
+    # sqrt(n) rounded to the nearest integer
+    return (isqrt(4 * n) + 1) >> 1
+
+
+def div_round(a, b):
+    # a / b rounded to the nearest integer, halves away from 0, b > 0
+    if a >= 0:
+        return (2 * a + b) // (2 * b)
+    return -((b - 2 * a) // (2 * b))
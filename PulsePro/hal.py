@@ -0,0 +1,26 @@
+# Hardware abstraction layer.
+# PulsePro modules import their hardware from here instead of machine,
+# ssd1306, piotimer and time. On the Pico these are the real drivers; when
+# `machine` can't be imported (CPython on a Linux host) the simulated backends
+# from sim.py are used instead, so the signal path and the UI can be run and
+# profiled without a Pico attached.
+
+try:
+    import machine
+except ImportError:
+    machine = None
+
+if machine is not None:
+    SIMULATED = False
+    from machine import Pin, ADC, I2C, disable_irq, enable_irq
+    from ssd1306 import SSD1306_I2C
+    from piotimer import Piotimer
+    from led import Led
+    from framebuf import FrameBuffer, MONO_VLSB
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms
+    Timer = machine.Timer
+else:
+    SIMULATED = True
+    from sim import Pin, ADC, I2C, disable_irq, enable_irq
+    from sim import SSD1306_I2C, Piotimer, Led, FrameBuffer, MONO_VLSB, Timer
+    from sim import ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms
@@ -0,0 +1,196 @@
+from array import array
+from hal import ticks_us
+import tracing
+from fixedpoint import div_round, sqrt_round
+from peak_detector import PeakDetector
+from filters import SignalFilter
+from quality import SignalQuality
+
+
+class HeartRateDetector:
+    def __init__(self, oled, sampler, ppi, hrv_stats, window_ms=3900, recorder=None, plot=None, beats=3, max_window_ms=11700):
+        self.oled = oled
+        self.sampler = sampler # Sampler, or recording.Replay to analyse a recording again
+        self.recorder = recorder # recording.Recorder to save the raw samples, None = not saved
+        self.plot = plot # plot.LivePlot of the filtered signal, None = no plot
+        self.ppi = ppi # peak to peak intervals of the measurement
+        self.hrv_stats = hrv_stats # HRV values, updated on every beat
+        self.rate = sampler.rate
+        # A window ends as soon as `beats` regular intervals are seen. If it hasn't
+        # after window_ms it is extended by window_ms while beats are coming
+        # (at least one interval), up to max_window_ms, otherwise it ends with
+        # the reason in `status`.
+        self.window_ms = window_ms
+        self.max_window_ms = max_window_ms
+        self.filter = SignalFilter() # baseline removal and low-pass before the detector
+        self.detector = PeakDetector(self.rate) # streaming detector, fed one sample at a time
+        self.quality = SignalQuality(beats, min_amplitude=self.detector.min_amplitude)
+        self.status = None # "OK" or why the last window had no BPM, None before the first one
+        self.bpm = None # BPM of the last window that had one
+        self.sqi = None # signal quality index 0..100 of the last window
+        self.first_bpm = -1 # sample index of the first BPM of the measurement
+        self.dropped = 0 # samples lost in the last measurement, sampler Fifo was full
+        self.dropped_start = 0 # sampler.dropped() when it started
+        self.window = 0
+        self.max_window = 0
+        self.window_start = 0
+        self.window_end = 0
+        
+    def calculate_threshold(self, arr):
+        # mean + standard deviation, integers on the 12 bit ADC scale
+        import kernels # batch only, not loaded for a measurement
+        arr = kernels.as_buffer(arr)
+        n = len(arr)
+        mean = div_round(kernels.total(arr, n, 4), n)
+        summary = kernels.squares(arr, n, mean, 4)
+        std_dev = sqrt_round(div_round(summary, n))
+        threshold = ((mean + std_dev) << 4) + 8 # + 8: middle of the dropped 4 bits
+        return threshold
+
+
+    def detect_peaks(self, arr): # batch version, for re-analysing a whole recording
+        import kernels
+        arr = kernels.as_buffer(arr)
+        threshold = self.calculate_threshold(arr)
+        peaks = array('I', bytes(4 * (len(arr) // 2 + 1))) # at most every other sample
+        count = kernels.maxima(arr, len(arr), threshold, peaks)
+        return peaks[:count]
+
+    
+    def calculate_heart_rate(self, sensor_values):
+        peaks = self.detect_peaks(sensor_values)
+        if len(peaks) < 2:
+            return None
+        # 60 s / (samples between peaks / rate), in integers
+        heart_rate = div_round(60 * self.rate * (len(peaks) - 1), peaks[-1] - peaks[0])
+        return heart_rate
+
+    def show_bpm(self, heart_rate, sqi=None):
+        if heart_rate is not None and 30 < heart_rate < 150:
+            self.oled.fill_rect(0, 14, 128, 10, 0) # also clears a reason shown before
+            hr = str(round(heart_rate))
+            self.oled.text(hr, 52,15,1)
+            if sqi is not None:
+                self.oled.text("Q" + str(sqi), 96, 15, 1) # signal quality, right of the BPM
+            self.oled.show()
+
+    def show_status(self, text):
+        # Shown instead of the BPM when a window ended without one
+        self.oled.fill_rect(0, 14, 128, 10, 0)
+        self.oled.text(text, (128 - 8 * len(text)) // 2, 15, 1)
+        self.oled.show()
+
+    def stop(self):
+        # Stops sampling, and the recording if there is one
+        if tracing.on:
+            t0 = ticks_us()
+        self.sampler.stop()
+        self.dropped = self.sampler.dropped() - self.dropped_start
+        if self.recorder is not None:
+            print("Recorded", self.recorder.stop(self.sampler.filled))
+        if tracing.on:
+            tracing.span(tracing.STOP, t0)
+
+    def start(self):
+        # Starts a new measurement window
+        self.prepare()
+        self.sampler.start()
+
+    def prepare(self):
+        # Everything start() does except starting the sampler
+        self.status = None
+        self.bpm = None
+        self.sqi = None
+        self.first_bpm = -1
+        self.dropped = 0
+        self.dropped_start = self.sampler.dropped() # the Fifo's count never goes back to 0
+        self.filter.reset()
+        self.detector.reset()
+        self.quality.reset()
+        self.ppi.new_window()
+        self.window = self.window_ms * self.rate // 1000 # in samples
+        self.max_window = self.max_window_ms * self.rate // 1000
+        self.window_start = 0
+        self.window_end = self.window
+        if self.recorder is not None:
+            self.recorder.start()
+        if self.plot is not None:
+            self.plot.reset()
+
+    def process(self):
+        # Runs the samples waiting in the sampler Fifo through the detector,
+        # returns True when a window ended, with a BPM or with a reason
+        if tracing.on:
+            t0 = ticks_us()
+        recorder = self.recorder
+        plot = self.plot
+        quality = self.quality
+        detector = self.detector
+        done = False
+        while self.sampler.has_data():
+            value = self.sampler.get()
+            if value is None: # a replayed recording ended early
+                break
+            quality.add_sample(value)
+            if recorder is not None:
+                recorder.add(value)
+            value = self.filter.add(value)
+            if plot is not None:
+                plot.add(value)
+            peak = detector.add(value)
+            if peak >= 0 and self.add_peak(peak, detector.index, detector.high - detector.low):
+                done = True
+                break
+            if detector.index + 1 >= self.window_end and self.window_timeout(detector.index, detector.high - detector.low):
+                done = True
+                break
+        if plot is not None:
+            plot.show() # at most one frame every plot.frame_ms
+        if tracing.on:
+            tracing.span(tracing.PROCESS, t0)
+        return done
+
+    # index: the detector's sample index and span: detector.high - detector.low
+    # when the peak was found or the window's time was up. They're passed in
+    # and not read from the detector, which may already be further on core 1.
+
+    def add_peak(self, peak, index, span):
+        # True if the window ended because the last intervals were regular
+        interval = self.ppi.add_peak(peak)
+        if not interval:
+            return False
+        self.hrv_stats.add(interval)
+        self.quality.add_interval(interval)
+        if not self.quality.consistent():
+            return False
+        if self.first_bpm < 0:
+            self.first_bpm = index
+        self.status = "OK"
+        self.bpm = self.quality.bpm()
+        self.sqi = self.quality.index(span)
+        self.show_bpm(self.bpm, self.sqi)
+        self.end_window(index)
+        return True
+
+    def window_timeout(self, index, span):
+        # No BPM by the end of the window: wait longer while beats are coming,
+        # otherwise end it and show why. True if it ended.
+        quality = self.quality
+        reason = quality.reason(span)
+        if (reason in ("No beats", "Irregular") and quality.count >= 1
+                and self.window_end + self.window - self.window_start <= self.max_window):
+            self.window_end += self.window
+            return False
+        self.status = reason
+        self.sqi = quality.index(span)
+        self.show_status(reason)
+        self.end_window(index)
+        return True
+
+    def end_window(self, index):
+        # Starts the next window after sample index, sampling and detection go on
+        if tracing.on:
+            tracing.count(tracing.WINDOW)
+        self.quality.reset()
+        self.window_start = index + 1
+        self.window_end = self.window_start + self.window
@@ -0,0 +1,109 @@
+from fixedpoint import div_round, sqrt_round
+
+
+class HRVData:
+    def __init__(self, oled):
+        self.oled = oled
+    
+    # Batch calculators over a list of intervals, the device uses HRVAccumulator
+    # instead. kernels is imported on first use so measuring doesn't load it.
+
+    def meanPPI_calculator(self, data):
+        import kernels
+        return div_round(kernels.total(data, len(data)), len(data))
+
+    def meanHR_calculator(self, meanPPI):
+        return div_round(60*1000, meanPPI)
+
+    def SDNN_calculator(self, data, PPI):
+        import kernels
+        summary = kernels.squares(data, len(data), PPI)
+        return sqrt_round(div_round(summary, len(data) - 1))
+
+    def RMSSD_calculator(self, data):
+        import kernels
+        summary = kernels.diff_squares(data, len(data))
+        return sqrt_round(div_round(summary, len(data) - 1))
+
+    def display_HRV_values(self, mean_PPI, mean_HR, SDNN, RMSSD):
+        self.oled.text(f'MeanPPI:{int(mean_PPI)} ms', 0, 0, 1)
+        self.oled.text(f'MeanHR:{int(mean_HR)} bpm', 0, 15, 1)
+        self.oled.text(f'SDNN:{int(SDNN)} ms', 0, 30, 1)
+        self.oled.text(f'RMSSD:{int(RMSSD)} ms', 0, 45, 1)
+
+    def display_frequency_values(self, freq):
+        # freq is a FrequencyHRV.analyse() result
+        if freq is None:
+            self.oled.text('Measure at least', 0, 15, 1)
+            self.oled.text('32 s for LF/HF', 0, 30, 1)
+            return
+        ratio = freq['lf_hf']
+        self.oled.text(f"LF:{freq['lf']} ms2", 0, 0, 1)
+        self.oled.text(f"HF:{freq['hf']} ms2", 0, 15, 1)
+        self.oled.text(f'LF/HF:{ratio // 100}.{ratio % 100:02d}', 0, 30, 1)
+        self.oled.text(f"Total:{freq['total_power']} ms2", 0, 45, 1)
+
+
+# Incremental HRV statistics.
+# Every new interval updates the sums for the mean and variance, the sum of
+# squared successive differences, min/max and the NN50 count, so the values
+# are available at any time during a recording in O(1) memory.
+# Integers only: the sums are kept relative to the first interval (base), so
+# for normal recordings they stay small ints on MicroPython.
+class HRVAccumulator:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.base = 0 # first interval
+        self.sum = 0 # sum of (ppi - base)
+        self.sum_sq = 0 # sum of (ppi - base)^2
+        self.sum_sq_diff = 0 # sum of squared successive differences
+        self.nn50 = 0 # successive differences > 50 ms
+        self.last = 0
+        self.min = 0
+        self.max = 0
+
+    def add(self, ppi):
+        self.n += 1
+        if self.n == 1:
+            self.base = ppi
+            self.min = ppi
+            self.max = ppi
+        else:
+            diff = ppi - self.last
+            self.sum_sq_diff += diff * diff
+            if diff > 50 or diff < -50:
+                self.nn50 += 1
+            if ppi < self.min:
+                self.min = ppi
+            elif ppi > self.max:
+                self.max = ppi
+        self.last = ppi
+        d = ppi - self.base
+        self.sum += d
+        self.sum_sq += d * d
+
+    def snapshot(self):
+        # Current HRV values, rounded like the HRVData calculators
+        n = self.n
+        mean_ppi = self.base + div_round(self.sum, n) if n else 0
+        sdnn = 0
+        if n > 1:
+            # sum of squared differences from the mean, sum_sq - sum^2 / n
+            # with sum = q * n + r, without the large sum^2
+            q = self.sum // n
+            r = self.sum - q * n
+            m2 = self.sum_sq - q * self.sum - q * r - div_round(r * r, n)
+            sdnn = sqrt_round(div_round(max(0, m2), n - 1))
+        return {
+            'n': n,
+            'mean_ppi': mean_ppi,
+            'mean_hr': div_round(60 * 1000, mean_ppi) if mean_ppi else 0,
+            'sdnn': sdnn,
+            'rmssd': sqrt_round(div_round(self.sum_sq_diff, n - 1)) if n > 1 else 0,
+            'min_ppi': self.min,
+            'max_ppi': self.max,
+            'pnn50': div_round(100 * self.nn50, n - 1) if n > 1 else 0,
+        }
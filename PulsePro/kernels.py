@@ -0,0 +1,113 @@
+from array import array
+
+# Inner loops of the batch signal math: threshold statistics, local maximum
+# scan and interval differences. Buffers are arrays of unsigned 16 bit values
+# (array('H'), or a memoryview of one), like the raw samples and PPIStore.
+# On MicroPython the loops are the viper functions from kernels_viper.py, on
+# a PC (or a port without viper) the plain Python versions below are used.
+# COMPILED tells which ones are in use, tools/kernels_check.py compares both.
+# These are for batch and offline use only (tools/bench.py, re-analysing a
+# recording with detect_peaks and the HRVData calculators). A measurement on
+# the device goes through the streaming filter, PeakDetector and
+# HRVAccumulator, one sample or beat at a time, and never calls them, so the
+# device only imports this module when a batch function is first used.
+#
+# The viper versions use 32 bit ints, so the work is done in chunks of CHUNK
+# samples and the chunk sums are added up here. Values after the shift have
+# to fit in 12 bits (ADC samples >> 4, intervals in ms) for the squares.
+
+CHUNK = 64
+
+
+def py_total_range(buf, start, end, shift):
+    total = 0
+    for i in range(start, end):
+        total += buf[i] >> shift
+    return total
+
+
+def py_squares_range(buf, start, end, shift, mean):
+    total = 0
+    for i in range(start, end):
+        d = (buf[i] >> shift) - mean
+        total += d * d
+    return total
+
+
+def py_diff_squares_range(buf, start, end):
+    total = 0
+    prev = buf[start]
+    for i in range(start + 1, end):
+        value = buf[i]
+        total += (value - prev) * (value - prev)
+        prev = value
+    return total
+
+
+def py_maxima_range(buf, start, end, threshold, out, count, size):
+    # Indices i in [start, end) with buf[i - 1] < buf[i] > buf[i + 1] and
+    # buf[i] > threshold go to out from out[count], returns the new count
+    for i in range(start, end):
+        value = buf[i]
+        if value > buf[i - 1] and value > buf[i + 1] and value > threshold:
+            if count >= size:
+                break
+            out[count] = i
+            count += 1
+    return count
+
+
+total_range = py_total_range
+squares_range = py_squares_range
+diff_squares_range = py_diff_squares_range
+maxima_range = py_maxima_range
+
+try:
+    from kernels_viper import total_range, squares_range, diff_squares_range, maxima_range
+    COMPILED = True
+except (ImportError, SyntaxError): # CPython, or no native code emitter
+    COMPILED = False
+
+
+def as_buffer(values):
+    # The viper functions need a buffer, lists are copied to an array
+    if COMPILED and isinstance(values, (list, tuple)):
+        return array('H', values)
+    return values
+
+
+def total(buf, n, shift=0):
+    # sum of buf[i] >> shift
+    buf = as_buffer(buf)
+    result = 0
+    for start in range(0, n, CHUNK):
+        result += total_range(buf, start, min(n, start + CHUNK), shift)
+    return result
+
+
+def squares(buf, n, mean, shift=0):
+    # sum of ((buf[i] >> shift) - mean)^2
+    buf = as_buffer(buf)
+    result = 0
+    for start in range(0, n, CHUNK):
+        result += squares_range(buf, start, min(n, start + CHUNK), shift, mean)
+    return result
+
+
+def diff_squares(buf, n):
+    # sum of (buf[i + 1] - buf[i])^2, the chunks overlap by one value
+    buf = as_buffer(buf)
+    result = 0
+    for start in range(0, n - 1, CHUNK):
+        result += diff_squares_range(buf, start, min(n, start + CHUNK + 1))
+    return result
+
+
+def maxima(buf, n, threshold, out):
+    # Local maxima above threshold, their indices are written to out
+    # (array('I')), returns how many. Stops when out is full.
+    buf = as_buffer(buf)
+    count = 0
+    if n > 2:
+        count = maxima_range(buf, 1, n - 1, threshold, out, 0, len(out))
+    return count
@@ -0,0 +1,56 @@
+import micropython
+
+# Viper versions of the loops in kernels.py, only imported on MicroPython.
+# Same arguments and results as the Python versions there. Viper ints are
+# 32 bit machine words, kernels.py calls these on chunks short enough that
+# the sums cannot overflow.
+
+
+@micropython.viper
+def total_range(buf, start: int, end: int, shift: int) -> int:
+    p = ptr16(buf)
+    total = 0
+    for i in range(start, end):
+        total += int(p[i]) >> shift
+    return total
+
+
+@micropython.viper
+def squares_range(buf, start: int, end: int, shift: int, mean: int) -> int:
+    p = ptr16(buf)
+    total = 0
+    for i in range(start, end):
+        d = (int(p[i]) >> shift) - mean
+        total += d * d
+    return total
+
+
+@micropython.viper
+def diff_squares_range(buf, start: int, end: int) -> int:
+    p = ptr16(buf)
+    total = 0
+    prev = int(p[start])
+    for i in range(start + 1, end):
+        value = int(p[i])
+        d = value - prev
+        total += d * d
+        prev = value
+    return total
+
+
+@micropython.viper
+def maxima_range(buf, start: int, end: int, threshold: int, out, count: int, size: int) -> int:
+    p = ptr16(buf)
+    o = ptr32(out)
+    prev = int(p[start - 1])
+    value = int(p[start])
+    for i in range(start, end):
+        after = int(p[i + 1])
+        if value > prev and value > after and value > threshold:
+            if count >= size:
+                break
+            o[count] = i
+            count += 1
+        prev = value
+        value = after
+    return count
@@ -0,0 +1,121 @@
+OPTIONS = ['Measure HR', "Kubios", 'Exit']
+
+# Layouts of the screens that don't change, drawn once and then copied from
+# the ScreenCache (screens.py). They only draw, show() sends them.
+
+def welcome_screen(oled):
+    oled.fill(1)
+    oled.text("Welcome to", 24, 5, 0)
+    oled.text("Pulse Pro", 24, 25, 0)
+
+def press_start_screen(oled):
+    oled.fill(0)
+    oled.text("Press the Button",0,0,1)
+    oled.text("To Measure",0,12,1)
+    oled.text("Your HeartBeat!!",0,24,1)
+    oled.line(118, 48, 124, 53, 1)
+    oled.line(118, 58, 124, 53, 1)
+    oled.line(93, 53, 124, 53, 1)
+
+def goodbye_screen(oled):
+    oled.fill(0)
+    oled.text("Goodbye!!!",25,26,1)
+
+def menu_screen(oled): # without the arrow
+    oled.fill(0)
+    oled.text("Choose an Option:",0,0,1)
+    for i, state in enumerate(OPTIONS):
+        oled.text(f"{i + 1}) {state} ", 0, 20 + i * 10)
+
+def measure_screen(oled):
+    oled.fill(0)
+    oled.text("BPM", 50, 5)
+    oled.text("--", 52, 15)
+    oled.text("Press button to", 0, 40)
+    oled.text("continue to HRV", 0, 50)
+
+def exit_screen(oled):
+    oled.fill(0)
+    oled.text("Do you want to", 0, 0)
+    oled.text("turn off the", 0, 9)
+    oled.text(" device?", 0, 16)
+
+def sending_screen(oled):
+    oled.fill(0)
+    oled.text("Sending Info to ", 0, 28)
+    oled.text("The Server... ", 10, 38)
+
+def sent_screen(oled):
+    oled.fill(0)
+    oled.text("The Infomation", 0, 28)
+    oled.text("Has Been Sent!!!", 0, 38)
+
+def no_connection_screen(oled):
+    oled.fill(0)
+    oled.text("Connection Could", 0, 17)
+    oled.text("Not be Made, It", 0, 27)
+    oled.text("Is Sent Later..", 0, 37)
+
+def send_failed_screen(oled):
+    oled.fill(0)
+    oled.text("Unable to Send", 0, 17)
+    oled.text("Info, It Is Sent", 0, 27)
+    oled.text("Later...", 0, 37)
+
+
+class MenuDisplay:
+    def __init__(self, oled, led_onboard, screens=None): #initializes with an OLED display object and LED pins
+        self.oled = oled
+        self.led_onboard = led_onboard
+        self.screens = screens # ScreenCache, None = draw every screen every time
+        self.options = OPTIONS
+        # x of the arrow on each row, where " <--" used to start plus its space
+        self.arrow_x = [8 * (len(f"{i + 1}) {state} ") + 1) for i, state in enumerate(OPTIONS)]
+        self.options_state = ""
+        self.current_row = 0
+
+    def show(self, layout, send=True):
+        # send=False: only into the display buffer, to draw over it first
+        if self.screens is not None:
+            self.screens.load(layout)
+        else:
+            layout(self.oled)
+        if send:
+            self.oled.show()
+
+    def update(self):   #shows current state of each LED on the OLED
+        self.show(menu_screen, False)
+        row = self.current_row
+        self.oled.text("<--", self.arrow_x[row], 20 + row * 10)
+        self.oled.show()
+
+    def next_opt(self): #navigates through LEDs
+        self.current_row = (self.current_row + 1) % len(self.options)
+
+    def prev_opt(self): #navigates through LEDs
+        self.current_row = (self.current_row - 1) % len(self.options)
+
+    def toggle_opt(self): #toggles the selected LED's state and updates its PWM signal
+        options_index = self.current_row
+        if options_index == 0:
+            self.options_state = "HRV"
+        elif options_index == 1:
+            self.options_state = "Kubios HRV"
+        elif options_index == 2:
+            self.options_state = "Exit"
+
+    def Welcome_Text(self):
+        self.led_onboard.on()
+        self.show(welcome_screen)
+
+    def Press_Start(self):
+        self.led_onboard.on()
+        self.show(press_start_screen)
+
+    def GoodBye(self):
+        self.show(goodbye_screen)
+
+    def Power_Off(self):
+        self.led_onboard.off()
+        self.oled.fill(0)
+        self.oled.show()
@@ -0,0 +1,211 @@
+import json
+from hal import ticks_ms, ticks_us, ticks_diff, ticks_add
+import tracing
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+# Network connection management.
+#
+# WlanManager joins the WLAN in the background from boot, caches the state
+# and IP address, and tries again with a growing delay when joining fails or
+# the link is lost. is_ready() is a cheap check and ready() can be awaited
+# with a deadline.
+#
+# MQTTLink is a long lived MQTT connection. It is made once and kept up
+# between measurements with MQTT pings, and made again automatically when it
+# breaks. A result is published as one compact JSON message with a schema
+# version instead of one message per value. The client comes from
+# client_factory, so a stand-in broker (sim.SimBroker) can be used for testing
+# on a PC.
+# umqtt's connect, ping and disconnect block the event loop, an unreachable
+# broker for the whole TCP timeout. That is longer than the sampler Fifo
+# lasts, so nothing is done in the background while busy() (measuring).
+
+
+class WlanManager:
+    def __init__(self, wlan, ssid, password, join_timeout_ms=10000, max_retry_ms=60000):
+        self.wlan = wlan # network.WLAN(network.STA_IF)
+        self.ssid = ssid
+        self.password = password
+        self.join_timeout_ms = join_timeout_ms # give up on one attempt after this
+        self.max_retry_ms = max_retry_ms
+        self.retry_ms = 1000 # doubles after every failed attempt
+        self.ip = None # cached while connected
+        self.state = "idle" # idle, joining, up, waiting (for the next attempt)
+        self.since = ticks_ms() # when the state last changed
+        self.up = asyncio.Event()
+
+    def set_state(self, state):
+        self.state = state
+        self.since = ticks_ms()
+
+    def join(self):
+        if self.state == "idle":
+            self.wlan.active(True) # only once, the interface stays active
+        try:
+            self.wlan.connect(self.ssid, self.password)
+        except OSError as e:
+            print("WLAN connect error:", e)
+        self.set_state("joining")
+
+    def is_ready(self):
+        return self.ip is not None
+
+    def poll(self):
+        # Updates the cached state, call regularly (run() does it)
+        connected = self.wlan.isconnected()
+        elapsed = ticks_diff(ticks_ms(), self.since)
+        if connected:
+            if self.ip is None:
+                self.ip = self.wlan.ifconfig()[0]
+                self.retry_ms = 1000
+                self.set_state("up")
+                self.up.set()
+                print("WLAN connected, IP", self.ip)
+        elif self.state == "up":
+            print("WLAN connection lost")
+            self.ip = None
+            self.up.clear()
+            self.join()
+        elif self.state == "joining" and elapsed > self.join_timeout_ms:
+            self.set_state("waiting")
+        elif self.state == "waiting" and elapsed > self.retry_ms:
+            self.retry_ms = min(self.retry_ms * 2, self.max_retry_ms)
+            self.wlan.disconnect()
+            self.join()
+        elif self.state == "idle":
+            self.join()
+
+    async def ready(self, deadline_ms=0):
+        # True once connected, False if that doesn't happen within deadline_ms
+        if self.ip is not None:
+            return True
+        if deadline_ms <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self.up.wait(), deadline_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        return self.ip is not None
+
+    async def run(self, period_ms=250):
+        # Background task, started at boot
+        while True:
+            self.poll()
+            await asyncio.sleep(period_ms / 1000)
+
+
+SCHEMA_VERSION = 1
+
+
+def encode_result(stats):
+    # {"v": 1, "mean_ppi": 870, "mean_hr": 69, "sdnn": 74, "rmssd": 62, ...}
+    msg = {"v": SCHEMA_VERSION}
+    msg.update(stats)
+    return json.dumps(msg, separators=(",", ":"))
+
+
+class MQTTLink:
+    def __init__(self, client_factory, topic="HRV_Info", keepalive=60, link_up=None, busy=None):
+        self.client_factory = client_factory # () -> MQTTClient that is not connected yet
+        self.topic = topic
+        self.keepalive = keepalive # s, same value as given to the MQTTClient
+        self.link_up = link_up # () -> True when the WLAN is connected, None = always
+        self.busy = busy # () -> True while measuring, no pings or reconnects then
+        self.client = None
+        self.last_used = 0 # ticks_ms of the last packet sent to the broker
+
+    def connected(self):
+        return self.client is not None
+
+    def idle(self):
+        # True when blocking on the network for a while does no harm
+        return self.busy is None or not self.busy()
+
+    def connect(self):
+        if self.client is not None:
+            return True
+        if self.link_up is not None and not self.link_up():
+            return False
+        if tracing.on:
+            t0 = ticks_us()
+        try:
+            client = self.client_factory()
+            client.connect(clean_session=True)
+        except Exception as e:
+            print("Error connecting to MQTT broker:", e)
+            return False
+        finally:
+            if tracing.on:
+                tracing.span(tracing.CONNECT, t0)
+        print("Connected to MQTT broker")
+        self.client = client
+        self.last_used = ticks_ms()
+        return True
+
+    def drop(self):
+        # Forget a broken connection, the next connect() makes a new one
+        if self.client is not None:
+            try:
+                self.client.disconnect()
+            except Exception:
+                pass
+        self.client = None
+
+    def publish(self, payload, topic=None):
+        # True when sent, False if sending failed, None if there is no connection
+        for attempt in range(2):
+            if not self.connect():
+                return None
+            if tracing.on:
+                t0 = ticks_us()
+            try:
+                self.client.publish(topic or self.topic, payload)
+                self.last_used = ticks_ms()
+                return True
+            except Exception as e:
+                print("Error publishing:", e)
+                self.drop() # try once more with a new connection
+            finally:
+                if tracing.on:
+                    tracing.span(tracing.PUBLISH, t0)
+        return False
+
+    def send_result(self, stats):
+        return self.publish(encode_result(stats))
+
+    def ping(self):
+        # Keeps the session alive, call often enough (run() does it)
+        if self.client is None:
+            return
+        if ticks_diff(ticks_ms(), self.last_used) < self.keepalive * 500:
+            return
+        try:
+            self.client.ping()
+            self.client.check_msg() # reads the ping response
+            self.last_used = ticks_ms()
+        except Exception as e:
+            print("MQTT connection lost:", e)
+            self.drop()
+
+    async def run(self, period_ms=1000, max_retry_ms=60000):
+        # Background task: keepalive pings, and reconnecting after errors with
+        # a retry delay that doubles up to max_retry_ms. Waits while busy, the
+        # broker drops the session after 1.5 keepalives without a ping and it
+        # is made again after the measurement.
+        retry_ms = period_ms
+        next_try = ticks_ms()
+        while True:
+            if not self.idle():
+                pass
+            elif self.client is not None:
+                self.ping()
+                retry_ms = period_ms
+            elif ticks_diff(ticks_ms(), next_try) >= 0:
+                if not self.connect():
+                    retry_ms = min(retry_ms * 2, max_retry_ms)
+                next_try = ticks_add(ticks_ms(), retry_ms)
+            await asyncio.sleep(period_ms / 1000)
@@ -0,0 +1,128 @@
+import struct
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+# Results that could not be sent, kept in a file on flash until they can.
+# The file is a fixed size ring of fixed size records with a small header:
+#   header  magic "PPQ2", head (next record to send), tail (next record to
+#           write), capacity, record size
+#   record  seq, time (time.time() when the measurement ended), n, mean_ppi,
+#           mean_hr, sdnn, rmssd, min_ppi, max_ppi, pnn50, dropped, and the
+#           Kubios values vlf, lf, hf, total_power, lf_hf, length_s
+# The values are unsigned 16 bit, in the units of the result: ms, bpm, ms^2
+# and lf_hf in 1/100. Larger values are stored as 65535. length_s 0 means a
+# result without frequency values, they are left out when it's sent.
+# head and tail only grow, record i is in slot i % capacity. When the ring is
+# full the oldest result is overwritten. run() is a background task that sends
+# the saved results in batches while the MQTT link is connected and idle (not
+# measuring). It never connects itself: a blocking connect every period to a
+# broker that is down would stall the UI, so reconnecting is left to
+# MQTTLink.run(), which waits longer after every failed attempt.
+
+MAGIC = b"PPQ2"
+HEADER = "<4sIIHH"
+RECORD = "<II15H"
+FIELDS = ("n", "mean_ppi", "mean_hr", "sdnn", "rmssd", "min_ppi", "max_ppi", "pnn50", "dropped",
+          "vlf", "lf", "hf", "total_power", "lf_hf", "length_s")
+FREQ_FIELDS = 6 # the last ones in FIELDS, only in Kubios results
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD_SIZE = struct.calcsize(RECORD)
+
+
+class Outbox:
+    def __init__(self, name="outbox.bin", capacity=100):
+        self.name = name
+        self.capacity = capacity
+        self.header = bytearray(HEADER_SIZE)
+        self.record = bytearray(RECORD_SIZE)
+        self.head = 0
+        self.tail = 0
+        self.open()
+
+    def open(self):
+        try:
+            f = open(self.name, "rb")
+            f.readinto(self.header)
+            f.close()
+            magic, head, tail, capacity, size = struct.unpack(HEADER, self.header)
+            if magic == MAGIC and capacity == self.capacity and size == RECORD_SIZE:
+                self.head = head
+                self.tail = tail
+                return
+        except OSError:
+            pass
+        # No file yet or a different layout, start an empty one
+        with open(self.name, "wb") as f:
+            f.write(bytes(HEADER_SIZE))
+            zero = bytes(RECORD_SIZE)
+            for i in range(self.capacity):
+                f.write(zero)
+        self.head = 0
+        self.tail = 0
+        self.write_header()
+
+    def write_header(self, f=None):
+        struct.pack_into(HEADER, self.header, 0, MAGIC, self.head, self.tail, self.capacity, RECORD_SIZE)
+        if f is None:
+            with open(self.name, "r+b") as f:
+                f.write(self.header)
+        else:
+            f.seek(0)
+            f.write(self.header)
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def append(self, stats):
+        values = [min(0xFFFF, max(0, int(stats.get(k, 0)))) for k in FIELDS]
+        struct.pack_into(RECORD, self.record, 0, self.tail, int(stats.get("time", 0)), *values)
+        with open(self.name, "r+b") as f:
+            f.seek(HEADER_SIZE + (self.tail % self.capacity) * RECORD_SIZE)
+            f.write(self.record)
+            self.tail += 1
+            if self.tail - self.head > self.capacity:
+                self.head = self.tail - self.capacity # oldest one was overwritten
+            self.write_header(f)
+
+    def peek(self, count):
+        # Up to count oldest results as dicts like the ones given to append(), plus "seq"
+        results = []
+        with open(self.name, "rb") as f:
+            for seq in range(self.head, min(self.tail, self.head + count)):
+                f.seek(HEADER_SIZE + (seq % self.capacity) * RECORD_SIZE)
+                f.readinto(self.record)
+                values = struct.unpack(RECORD, self.record)
+                result = {"seq": values[0], "time": values[1]}
+                fields = len(FIELDS)
+                if not values[-1]: # length_s 0, no frequency values
+                    fields -= FREQ_FIELDS
+                for i in range(fields):
+                    result[FIELDS[i]] = values[i + 2]
+                results.append(result)
+        return results
+
+    def remove(self, count):
+        self.head = min(self.tail, self.head + count)
+        self.write_header()
+
+    def flush(self, link, batch=10):
+        # Sends up to batch saved results, returns how many were sent
+        sent = 0
+        for result in self.peek(batch):
+            if not link.send_result(result):
+                break
+            sent += 1
+        if sent:
+            self.remove(sent) # one header write for the whole batch
+        return sent
+
+    async def run(self, link, period_ms=5000, batch=10):
+        # Background task, empties the outbox whenever the link is up
+        while True:
+            if len(self) and link.connected() and link.idle():
+                while len(self) and self.flush(link, batch) == batch:
+                    await asyncio.sleep(0) # let the UI run between batches
+            await asyncio.sleep(period_ms / 1000)
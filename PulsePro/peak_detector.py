@@ -0,0 +1,78 @@
+# Streaming peak detector for the filtered PPG signal (see filters.py).
+# Takes one sample at a time and follows the upper and lower envelope of the
+# signal: each one jumps to a new maximum/minimum and otherwise moves towards
+# the other by 1/2^decay_shift of the distance per sample. A peak starts when
+# the signal rises above the middle of the envelopes and is reported as soon
+# as it drops below the lower quarter, so the threshold follows the pulse
+# amplitude and whatever baseline wander is left after filtering.
+# Nothing is stored per sample, so the cost is O(1) per sample and the memory
+# use is constant. Only plain Python is used so it also runs under CPython on
+# recorded captures.
+
+
+class PeakDetector:
+    def __init__(self, rate=250, min_interval_ms=300, decay_shift=7, min_amplitude=200):
+        self.rate = rate # samples per second, sample index is used as timestamp
+        self.decay_shift = decay_shift # 7: time constant of 128 samples, 0.5 s at 250 Hz
+        self.min_amplitude = min_amplitude # no peaks when the envelopes are closer (no finger)
+        self.warmup = rate // 2 # samples to let the filter and envelopes settle before detecting
+        self.refractory = rate * min_interval_ms // 1000 # min. samples between two peaks
+        self.reset()
+
+    def reset(self):
+        self.index = -1 # index of the last sample added
+        self.high = 0 # upper envelope
+        self.low = 0 # lower envelope
+        self.above = False # True while the signal is above the threshold
+        self.max_value = 0
+        self.max_index = 0
+        self.last_peak = -1
+        self.prev_peak = -1
+
+    def add(self, value):
+        # Returns the sample index of a detected peak, or -1
+        self.index += 1
+        high = self.high
+        low = self.low
+        step = (high - low) >> self.decay_shift
+        if value > high:
+            high = value
+        else:
+            high -= step
+        if value < low:
+            low = value
+        else:
+            low += step
+        self.high = high
+        self.low = low
+        if self.index < self.warmup:
+            return -1
+
+        span = high - low
+        if value > low + (span >> 1) and span > self.min_amplitude:
+            if not self.above or value > self.max_value:
+                self.max_value = value
+                self.max_index = self.index
+            self.above = True
+            return -1
+
+        if self.above and value < low + (span >> 2):
+            # Signal fell to the lower quarter, the maximum seen is the peak
+            self.above = False
+            if self.last_peak < 0 or self.max_index - self.last_peak >= self.refractory:
+                return self.add_peak(self.max_index)
+        return -1
+
+    def add_peak(self, index):
+        self.prev_peak = self.last_peak
+        self.last_peak = index
+        return index
+
+    def to_ms(self, index):
+        return index * 1000 // self.rate
+
+    def interval(self):
+        # Last peak to peak interval in samples, 0 if not known yet
+        if self.prev_peak < 0:
+            return 0
+        return self.last_peak - self.prev_peak
@@ -0,0 +1,105 @@
+from hal import FrameBuffer, MONO_VLSB, ticks_ms, ticks_diff
+
+# Live plot of the filtered PPG signal while measuring, so a bad finger
+# placement shows right away.
+# Every `decimate` samples become one pixel column (a bar from the smallest to
+# the largest sample, joined to the column before). add() only updates a few
+# numbers per sample and keeps the finished columns in a small ring. show() is
+# called from the measurement loop and at most every frame_ms it scrolls the
+# plot's own framebuffer left by the number of new columns, draws only those
+# columns and blits the plot to the screen, so only the pages of the plot
+# area are sent and the rest of the screen is never redrawn.
+# The vertical scale follows the signal: the running min/max jump to new
+# extremes and otherwise move towards each other, like the peak detector's
+# envelopes. Columns already drawn keep the scale they were drawn with.
+
+
+class LivePlot:
+    def __init__(self, oled, x=0, y=24, width=128, height=16, decimate=4, frame_ms=100, decay_shift=6):
+        self.oled = oled # Display, only the plot area is marked as changed
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.decimate = decimate # 4: 62.5 columns/s at 250 Hz, 2 s on a 128 pixel screen
+        self.frame_ms = frame_ms # min. time between two screen updates
+        self.decay_shift = decay_shift
+        self.buf = bytearray(width * ((height + 7) // 8))
+        self.fb = FrameBuffer(self.buf, width, height, MONO_VLSB)
+        self.lows = bytearray(width) # columns not drawn yet, rows from the bottom
+        self.highs = bytearray(width)
+        self.reset()
+
+    def reset(self):
+        self.fb.fill(0)
+        self.head = 0 # next slot in lows/highs
+        self.pending = 0 # columns waiting for show()
+        self.n = 0 # samples in the current column
+        self.low = 0
+        self.high = 0
+        self.top = None # running max, None until the first column
+        self.bottom = 0 # running min
+        self.prev_low = -1 # rows of the last column drawn, nothing to join to yet
+        self.prev_high = self.height
+        self.last_frame = ticks_ms()
+
+    def row(self, value):
+        span = self.top - self.bottom
+        if span <= 0:
+            return self.height >> 1
+        row = (value - self.bottom) * (self.height - 1) // span
+        return min(self.height - 1, max(0, row))
+
+    def add(self, value):
+        if self.n == 0:
+            self.low = value
+            self.high = value
+        elif value < self.low:
+            self.low = value
+        elif value > self.high:
+            self.high = value
+        self.n += 1
+        if self.n < self.decimate:
+            return
+        self.n = 0
+
+        if self.top is None:
+            self.top = self.high
+            self.bottom = self.low
+        step = (self.top - self.bottom) >> self.decay_shift
+        self.top = self.high if self.high > self.top else self.top - step
+        self.bottom = self.low if self.low < self.bottom else self.bottom + step
+
+        head = self.head
+        self.lows[head] = self.row(self.low)
+        self.highs[head] = self.row(self.high)
+        self.head = head + 1 if head + 1 < self.width else 0
+        if self.pending < self.width:
+            self.pending += 1 # when show() is late only the newest columns are kept
+
+    def show(self):
+        # Draws the new columns, returns True if the screen was updated
+        if not self.pending or ticks_diff(ticks_ms(), self.last_frame) < self.frame_ms:
+            return False
+        fb = self.fb
+        n = self.pending
+        x = self.width - n
+        fb.scroll(-n, 0)
+        fb.fill_rect(x, 0, n, self.height, 0)
+        i = self.head - n
+        if i < 0:
+            i += self.width
+        for x in range(x, self.width):
+            low = self.lows[i]
+            high = self.highs[i]
+            top = max(high, self.prev_low) # joins the bar to the one before
+            bottom = min(low, self.prev_high)
+            self.prev_low = low
+            self.prev_high = high
+            fb.vline(x, self.height - 1 - top, top - bottom + 1, 1)
+            i = i + 1 if i + 1 < self.width else 0
+        self.pending = 0
+        self.oled.blit_area(fb, self.x, self.y, self.width, self.height)
+        self.oled.show()
+        self.last_frame = ticks_ms()
+        return True
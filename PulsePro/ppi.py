@@ -0,0 +1,62 @@
+import array
+
+# Peak to peak interval (PPI) store.
+# Peak timestamps (sample indices from the detector) are turned into intervals
+# in milliseconds using the sample rate and kept in a preallocated array of
+# unsigned shorts (2 bytes per beat). When the array is full new intervals are
+# ignored instead of growing the heap.
+
+
+class PPIStore:
+    def __init__(self, rate=250, capacity=400, min_ms=250, max_ms=2000):
+        self.rate = rate
+        self.capacity = capacity # 400 beats is > 5 min at 80 bpm
+        self.min_ms = min_ms # intervals outside min_ms..max_ms are missed beats or noise
+        self.max_ms = max_ms
+        self.data = array.array('H')
+        for i in range(capacity):
+            self.data.append(0)
+        self.count = 0
+        self.last_peak = -1
+
+    def new_window(self):
+        # At the start of a measurement the detector's sample indices start
+        # again from 0, so the first peak only starts an interval. Windows
+        # inside a measurement don't call this, intervals go on across them.
+        self.last_peak = -1
+
+    def add_peak(self, index):
+        # Returns the interval in ms that was stored, 0 if nothing was stored
+        last = self.last_peak
+        self.last_peak = index
+        if last < 0:
+            return 0
+        ms = (index - last) * 1000 // self.rate
+        if ms < self.min_ms or ms > self.max_ms:
+            return 0
+        return self.add(ms)
+
+    def add(self, ms):
+        if self.count >= self.capacity:
+            return 0
+        self.data[self.count] = ms
+        self.count += 1
+        return ms
+
+    def clear(self):
+        self.count = 0
+        self.last_peak = -1
+
+    def values(self):
+        # Stored intervals without copying them
+        return memoryview(self.data)[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("PPI index out of range")
+        return self.data[i]
@@ -0,0 +1,104 @@
+from array import array
+
+# Signal quality of a heart rate measurement, decides when a window can end.
+# Three things are followed while measuring:
+#   regularity  the last `beats` peak to peak intervals are all within
+#               tolerance_pct of their mean
+#   amplitude   the peak detector's envelopes are at least min_amplitude apart
+#               (less: no finger on the sensor)
+#   clipping    raw samples at the ends of the ADC range (finger pressed too
+#               hard, or too much light)
+# As soon as the intervals are regular the window ends and the BPM is the
+# average of those intervals, so a clean signal gives a BPM after `beats`
+# intervals instead of after a fixed window. When they aren't, reason() says
+# what is wrong. index() is the same as a number from 0 (useless) to 100,
+# shown next to the BPM.
+# Everything is integers and the intervals are kept in a small array, so the
+# per sample cost is one compare.
+
+
+class SignalQuality:
+    def __init__(self, beats=3, tolerance_pct=12, min_amplitude=200, clip_low=512, clip_high=65024, max_clipped_pct=5):
+        self.beats = beats # consistent intervals needed for a BPM
+        self.tolerance_pct = tolerance_pct
+        self.min_amplitude = min_amplitude # same as the peak detector's, filtered signal
+        self.clip_low = clip_low # raw 16 bit ADC values at or outside these are clipped
+        self.clip_high = clip_high
+        self.max_clipped_pct = max_clipped_pct
+        self.intervals = array('H', bytes(2 * beats)) # ring of the last intervals, ms
+        self.reset()
+
+    def reset(self):
+        # At the start of every window, the next BPM needs `beats` new intervals
+        self.count = 0 # intervals in the ring, at most beats
+        self.pos = 0
+        self.samples = 0
+        self.clipped = 0
+
+    def add_sample(self, raw):
+        self.samples += 1
+        if raw <= self.clip_low or raw >= self.clip_high:
+            self.clipped += 1
+
+    def add_counts(self, samples, clipped):
+        # Same as add_sample() for samples counted somewhere else (dualcore.py)
+        self.samples += samples
+        self.clipped += clipped
+
+    def add_interval(self, ms):
+        self.intervals[self.pos] = ms
+        self.pos = self.pos + 1 if self.pos + 1 < self.beats else 0
+        if self.count < self.beats:
+            self.count += 1
+
+    def mean(self):
+        if not self.count:
+            return 0
+        total = 0
+        for i in range(self.count):
+            total += self.intervals[i]
+        return total // self.count
+
+    def spread_pct(self):
+        # Largest distance of an interval from the mean, % of the mean
+        mean = self.mean()
+        if not mean:
+            return 100
+        worst = 0
+        for i in range(self.count):
+            worst = max(worst, abs(self.intervals[i] - mean))
+        return worst * 100 // mean
+
+    def clipped_pct(self):
+        if not self.samples:
+            return 0
+        return self.clipped * 100 // self.samples
+
+    def consistent(self):
+        return self.count >= self.beats and self.spread_pct() <= self.tolerance_pct and self.clipped_pct() <= self.max_clipped_pct
+
+    def bpm(self):
+        # Average of the intervals in the ring, None if there are none
+        mean = self.mean()
+        if not mean:
+            return None
+        return (60000 + (mean >> 1)) // mean
+
+    def reason(self, span):
+        # What is wrong with the window, span: detector.high - detector.low
+        if self.clipped_pct() > self.max_clipped_pct:
+            return "Clipping"
+        if span < self.min_amplitude:
+            return "No finger"
+        if self.count < 2:
+            return "No beats"
+        return "Irregular"
+
+    def index(self, span):
+        # 0..100, the worst of regularity, amplitude and clipping
+        regular = 0
+        if self.count >= 2:
+            regular = max(0, 100 - 50 * self.spread_pct() // self.tolerance_pct)
+        amplitude = min(100, 100 * span // (4 * self.min_amplitude))
+        clipping = max(0, 100 - 100 * self.clipped_pct() // (2 * self.max_clipped_pct))
+        return min(regular, amplitude, clipping)
@@ -0,0 +1,189 @@
+import os
+import struct
+import time
+from array import array
+from hal import ticks_ms, ticks_diff
+
+# Raw PPG recordings on flash, so a measurement can be replayed and analysed
+# again later, on the Pico or on a PC (tools/replay.py).
+#
+# File format (little endian):
+#   header  magic "PPR1", version, sample rate (Hz), start time (time.time()
+#           of the Pico clock, s), start ticks_ms, duration (ms), sample count,
+#           filled (samples put in by the Sampler for missed interrupts,
+#           version 2 only)
+#   data    the read_u16() values as unsigned 16 bit ints
+# The count, duration and filled are written when the recording stops. If that
+# never happened (power off) the count is taken from the file size instead.
+#
+# Recorder collects the samples in a preallocated chunk and writes a whole
+# chunk at a time from the main loop, never from the timer interrupt. Writing
+# doesn't stop sampling for good but it does pause it: on the RP2040 littlefs
+# programs and erases the flash with interrupts off, and erasing a 4 KB sector
+# (every 2048 samples) takes tens of ms. littlefs never writes a block in
+# place, so erasing ahead of time doesn't help. The Sampler puts in the
+# samples of the missed interrupts instead, interpolated, so sample i is still
+# at i / rate, and the recording says how many samples were made up that way.
+# Replay reads a recording back in chunks and has the same has_data()/get() as
+# Sampler, so HeartRateDetector can use it in place of the ADC.
+
+MAGIC = b"PPR1"
+VERSION = 2
+HEADER = "<4sHHIIIII"
+HEADER_SIZE = struct.calcsize(HEADER)
+HEADER_V1 = "<4sHHIIII" # without filled
+HEADER_V1_SIZE = struct.calcsize(HEADER_V1)
+
+
+def read_header(name):
+    # Header of a recording as a dict, ValueError if it isn't one.
+    # "offset" is where the samples start in the file.
+    with open(name, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_V1_SIZE or data[:4] != MAGIC:
+        raise ValueError("not a recording: " + name)
+    version = struct.unpack_from("<H", data, 4)[0]
+    if version == 1:
+        magic, version, rate, start_time, start_ms, duration_ms, count = struct.unpack(HEADER_V1, data[:HEADER_V1_SIZE])
+        filled = 0
+        offset = HEADER_V1_SIZE
+    elif version == VERSION and len(data) == HEADER_SIZE:
+        magic, version, rate, start_time, start_ms, duration_ms, count, filled = struct.unpack(HEADER, data)
+        offset = HEADER_SIZE
+    else:
+        raise ValueError("not a recording: " + name)
+    if count == 0: # not stopped properly, use what is in the file
+        count = (os.stat(name)[6] - offset) // 2
+        duration_ms = count * 1000 // rate
+    return {"rate": rate, "start_time": start_time, "start_ms": start_ms,
+            "duration_ms": duration_ms, "count": count, "filled": filled, "offset": offset}
+
+
+class Recorder:
+    def __init__(self, folder="rec", rate=250, chunk=512, keep=5):
+        self.folder = folder # recordings are folder/0001.ppg, folder/0002.ppg...
+        self.rate = rate
+        self.chunk = chunk # samples per write, 512 = 1 KB
+        self.keep = keep # older recordings are deleted
+        self.buf = array('H', bytes(2 * chunk))
+        self.header = bytearray(HEADER_SIZE)
+        self.pos = 0
+        self.count = 0
+        self.file = None
+        self.name = None
+        self.start_time = 0
+        self.start_ms = 0
+        self.filled = 0
+
+    def files(self):
+        # Names of the recordings, oldest first
+        try:
+            names = [name for name in os.listdir(self.folder) if name.endswith(".ppg")]
+        except OSError:
+            os.mkdir(self.folder)
+            names = []
+        names.sort()
+        return names
+
+    def write_header(self, duration_ms):
+        struct.pack_into(HEADER, self.header, 0, MAGIC, VERSION, self.rate,
+                         self.start_time, self.start_ms, duration_ms, self.count, self.filled)
+        self.file.seek(0)
+        self.file.write(self.header)
+
+    def start(self):
+        self.stop()
+        names = self.files()
+        number = int(names[-1][:-4]) + 1 if names else 1
+        while names and len(names) >= self.keep:
+            os.remove(self.folder + "/" + names.pop(0))
+        self.name = "{}/{:04d}.ppg".format(self.folder, number)
+        self.file = open(self.name, "wb")
+        self.pos = 0
+        self.count = 0
+        self.filled = 0
+        self.start_time = int(time.time())
+        self.start_ms = ticks_ms()
+        self.write_header(0) # count 0 until stop()
+
+    def add(self, value):
+        self.buf[self.pos] = value
+        self.pos += 1
+        self.count += 1
+        if self.pos == self.chunk:
+            self.file.write(self.buf)
+            self.pos = 0
+
+    def stop(self, filled=0):
+        # Writes the rest of the samples and the final header, returns the file name.
+        # filled: Sampler.filled, samples that were made up for missed interrupts
+        if self.file is None:
+            return None
+        self.filled = filled
+        if self.pos:
+            self.file.write(memoryview(self.buf)[:self.pos])
+            self.pos = 0
+        self.write_header(self.count * 1000 // self.rate)
+        self.file.close()
+        self.file = None
+        return self.name
+
+
+class Replay:
+    def __init__(self, name, chunk=512, paced=True):
+        self.name = name
+        self.paced = paced # True: samples come at the recorded rate, False: as fast as they are read
+        info = read_header(name)
+        self.rate = info["rate"]
+        self.count = info["count"]
+        self.offset = info["offset"]
+        self.filled = 0 # same as Sampler, nothing is missed when reading a file
+        self.buf = array('H', bytes(2 * chunk))
+        self.file = None
+        self.pos = 0
+        self.end = 0
+        self.done = 0 # samples given out
+        self.start_ms = 0
+
+    def start(self):
+        self.stop()
+        self.file = open(self.name, "rb")
+        self.file.seek(self.offset)
+        self.pos = 0
+        self.end = 0
+        self.done = 0
+        self.start_ms = ticks_ms()
+
+    def stop(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def available(self):
+        if self.file is None:
+            return 0
+        count = self.count
+        if self.paced:
+            count = min(count, ticks_diff(ticks_ms(), self.start_ms) * self.rate // 1000)
+        return count - self.done
+
+    def has_data(self):
+        return self.available() > 0
+
+    def get(self):
+        # Next sample, None if the file ended before the count in the header
+        if self.pos == self.end:
+            self.end = self.file.readinto(self.buf) // 2
+            self.pos = 0
+            if self.end == 0:
+                print("Recording ends after", self.done, "of", self.count, "samples")
+                self.count = self.done
+                self.stop() # has_data() is False from here on
+                return None
+        value = self.buf[self.pos]
+        self.pos += 1
+        self.done += 1
+        return value
+
+    def dropped(self):
+        return 0
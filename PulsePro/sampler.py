@@ -0,0 +1,67 @@
+from fifo import Fifo
+from hal import Piotimer, ticks_us, ticks_diff
+import tracing
+
+# Fixed rate ADC sampling.
+# A Piotimer interrupt reads the ADC at exactly `rate` Hz and puts the value in
+# a preallocated Fifo (array backed ring buffer), so the sample index is a real
+# timestamp and the interrupt handler never allocates. The main loop drains the
+# Fifo whenever it has time.
+# Interrupts can still be missed: on the RP2040 a flash write or erase (the
+# recorder, the outbox) runs with interrupts turned off, a 4 KB erase for tens
+# of ms. The handler checks the time since the last interrupt and puts in
+# the missed samples, linearly interpolated, so the sample index stays a
+# timestamp. `filled` counts them.
+
+
+class Sampler:
+    def __init__(self, adc, rate=250, size=250):
+        self.adc = adc
+        self.rate = rate
+        self.samples = Fifo(size, typecode='H') # room for 1 s of samples at 250 Hz
+        self.timer = None
+        self.period_us = 1000000 // rate
+        self.late_us = self.period_us * 3 // 2 # longer since the last interrupt: some were missed
+        self.last_us = 0 # time of the last interrupt
+        self.last_value = 0
+        self.filled = 0 # samples put in for missed interrupts since start()
+
+    def handler(self, tid):
+        now = ticks_us()
+        value = self.adc.read_u16()
+        elapsed = ticks_diff(now, self.last_us)
+        if elapsed > self.late_us:
+            missed = (elapsed + (self.period_us >> 1)) // self.period_us - 1
+            last = self.last_value
+            for i in range(1, missed + 1):
+                self.samples.put(last + (value - last) * i // (missed + 1))
+            self.filled += missed
+        self.samples.put(value)
+        self.last_value = value
+        if tracing.samples:
+            tracing.span(tracing.SAMPLE, self.last_us)
+        self.last_us = now
+
+    def start(self):
+        self.stop()
+        while self.samples.has_data(): # throw away anything left from the last run
+            self.samples.get()
+        self.filled = 0
+        self.last_value = self.adc.read_u16() # missed samples before the first interrupt start from here
+        self.last_us = ticks_us() # the first interrupt comes one period from now
+        self.timer = Piotimer(mode=Piotimer.PERIODIC, freq=self.rate, callback=self.handler)
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    def has_data(self):
+        return self.samples.has_data()
+
+    def get(self):
+        return self.samples.get()
+
+    def dropped(self):
+        # Samples lost because the Fifo was full, main loop was too slow
+        return self.samples.dropped()
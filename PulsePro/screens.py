@@ -0,0 +1,110 @@
+import os
+import struct
+import sys
+
+# Screens that never change, drawn once and then copied into the display.
+# A layout is a function that draws a whole screen on the Display without
+# sending it. The first time a layout is shown its finished 1 KB buffer is
+# kept in RAM and appended to a file on flash, so after a restart it's read
+# back instead of drawn. Showing it again is one compare and one copy into
+# the display buffer, nothing is allocated and nothing is sent if the screen
+# already looks like that. Parts that change (the menu arrow, the BPM) are
+# drawn over the copy.
+# File: magic "PPS" + VERSION byte, the build the screens were drawn with,
+# then records of the layout's name (16 bytes, zero padded) and its buffer.
+# The build is the MicroPython version (the font is in the firmware) and the
+# size and time of the file the layouts are in (menu.py or menu.mpy). When
+# either one changes, e.g. a new menu.mpy is copied to the Pico, the old file
+# is thrown away and the screens drawn again.
+
+MAGIC = b"PPS"
+VERSION = 2
+BUILD = "<BBBxII" # MicroPython major, minor, micro, layout file size and mtime
+NAME_SIZE = 16
+HEADER_SIZE = 4 + struct.calcsize(BUILD)
+
+
+def build_id(source):
+    # Header of a file drawn with this firmware and this layout file
+    size = mtime = 0
+    if source:
+        try:
+            stat = os.stat(source)
+            size = stat[6]
+            mtime = stat[8]
+        except OSError:
+            pass
+    version = sys.implementation.version
+    return MAGIC + bytes((VERSION,)) + struct.pack(BUILD, version[0], version[1], version[2],
+                                                   size, mtime & 0xffffffff)
+
+
+class ScreenCache:
+    def __init__(self, oled, name="screens.bin", source=None):
+        self.oled = oled
+        self.name = name
+        self.header = build_id(source) # source: file of the layouts, menu.__file__
+        self.size = len(oled.buffer)
+        self.screens = {} # layout function -> buffer, the ones shown since boot
+        self.offsets = {} # layout name -> offset of its buffer in the file
+        self.scan()
+
+    def scan(self):
+        try:
+            length = os.stat(self.name)[6]
+            with open(self.name, "rb") as f:
+                if f.read(HEADER_SIZE) == self.header:
+                    offset = HEADER_SIZE
+                    while offset + NAME_SIZE + self.size <= length:
+                        name = f.read(NAME_SIZE).rstrip(b"\0").decode()
+                        self.offsets[name] = offset + NAME_SIZE
+                        offset += NAME_SIZE + self.size
+                        f.seek(offset)
+                    if offset == length:
+                        return
+        except OSError:
+            pass
+        # No file, another build or a record cut short, start again
+        self.offsets = {}
+        try:
+            with open(self.name, "wb") as f:
+                f.write(self.header)
+        except OSError:
+            pass
+
+    def get(self, layout):
+        buf = self.screens.get(layout)
+        if buf is not None:
+            return buf
+        buf = bytearray(self.size)
+        name = layout.__name__[:NAME_SIZE]
+        offset = self.offsets.get(name)
+        if offset is not None:
+            with open(self.name, "rb") as f:
+                f.seek(offset)
+                f.readinto(buf)
+        else:
+            self.draw(layout, name, buf)
+        self.screens[layout] = buf
+        return buf
+
+    def draw(self, layout, name, buf):
+        # Draws the layout in the display buffer, it's shown right after anyway
+        layout(self.oled)
+        buf[:] = self.oled.buffer
+        try:
+            with open(self.name, "ab") as f:
+                offset = f.seek(0, 2) + NAME_SIZE
+                f.write(name.encode() + bytes(NAME_SIZE - len(name)))
+                f.write(buf)
+            self.offsets[name] = offset
+        except OSError:
+            pass # flash full, the screen is still kept in RAM
+
+    def load(self, layout):
+        # Into the display buffer only, to draw the changing parts over it
+        self.oled.load(self.get(layout))
+
+    def show(self, layout):
+        self.oled.load(self.get(layout))
+        self.oled.show()
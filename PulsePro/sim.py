@@ -0,0 +1,536 @@
+# Simulated hardware for running PulsePro on a Linux host (CPython).
+# hal.py uses these classes when `machine` is not available. Time is virtual:
+# nothing happens until the clock is advanced, either directly or by sleep_ms,
+# and timers fire in order while it advances. This makes runs repeatable and
+# as fast as the host allows.
+#   ADC           replays a capture file (one value per line) at a set rate
+#   SSD1306_I2C   in-memory 128x64 framebuffer that counts the bytes "sent"
+#   Pin           input/output pin with irq handlers, driven by scripts
+#   Piotimer      periodic/one-shot timer running on the virtual clock
+#   EncoderScript rotary encoder turns and presses at given virtual times
+#   SimBroker     stand-in MQTT broker with clients like umqtt.simple
+#   SimWLAN       WLAN interface that joins after a virtual delay
+
+
+class VirtualClock:
+    def __init__(self):
+        self.us = 0
+        self.timers = [] # running timers, fired in order of their due time
+
+    def ticks_us(self):
+        return self.us
+
+    def ticks_ms(self):
+        return self.us // 1000
+
+    def advance_us(self, us):
+        end = self.us + us
+        while True:
+            due = None
+            for t in self.timers:
+                if t.next_us <= end and (due is None or t.next_us < due.next_us):
+                    due = t
+            if due is None:
+                break
+            self.us = due.next_us
+            due.fire()
+        self.us = end
+
+    def advance_ms(self, ms):
+        self.advance_us(ms * 1000)
+
+    def call_at(self, ms, func):
+        # Runs func() once when the clock reaches ms
+        return Timer(mode=Timer.ONE_SHOT, period=max(0, ms - self.ticks_ms()), callback=lambda t: func())
+
+    def reset(self):
+        self.us = 0
+        self.timers = []
+
+
+clock = VirtualClock()
+
+
+def ticks_us():
+    return clock.ticks_us()
+
+
+def ticks_ms():
+    return clock.ticks_ms()
+
+
+def ticks_diff(a, b):
+    return a - b
+
+
+def ticks_add(a, b):
+    return a + b
+
+
+def sleep_ms(ms):
+    clock.advance_ms(ms)
+
+
+def sleep(s):
+    clock.advance_us(int(s * 1000000))
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state):
+    pass
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.callback = None
+        if callback is not None:
+            self.init(mode=mode, period=period, freq=freq, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.deinit()
+        if freq > 0:
+            self.period_us = 1000000 // freq
+        else:
+            self.period_us = period * 1000
+        self.mode = mode
+        self.callback = callback
+        self.next_us = clock.us + self.period_us
+        clock.timers.append(self)
+
+    def fire(self):
+        if self.mode == Timer.PERIODIC:
+            self.next_us += max(1, self.period_us)
+        else:
+            self.deinit()
+        self.callback(self)
+
+    def deinit(self):
+        if self in clock.timers:
+            clock.timers.remove(self)
+
+
+Piotimer = Timer
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+    pins = {} # last Pin created for each id, used by drive()
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.level = 0 if value == 0 or pull == Pin.PULL_DOWN else 1
+        if mode == Pin.OUT and value is None:
+            self.level = 0
+        self.handler = None
+        self.trigger = 0
+        Pin.pins[id] = self
+
+    def value(self, v=None):
+        if v is None:
+            return self.level
+        self.set(v)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def on(self):
+        self.set(1)
+
+    def off(self):
+        self.set(0)
+
+    def toggle(self):
+        self.set(1 - self.level)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self.handler = handler
+        self.trigger = trigger
+
+    def set(self, v):
+        v = 1 if v else 0
+        old = self.level
+        self.level = v
+        if self.handler is None or old == v:
+            return
+        if (v == 0 and self.trigger & Pin.IRQ_FALLING) or (v == 1 and self.trigger & Pin.IRQ_RISING):
+            self.handler(self)
+
+
+def drive(pin_id, value):
+    # Set the level of an input pin from outside, like a button or the encoder
+    Pin.pins[pin_id].set(value)
+
+
+def read_capture(name):
+    # Capture files have one ADC value per line, like the capture_250Hz_*.txt files
+    with open(name) as f:
+        return [int(line) for line in f if line.strip()]
+
+
+class ADC:
+    sources = {} # channel -> (values, rate)
+
+    def __init__(self, channel):
+        if not isinstance(channel, int):
+            channel = channel.id
+        if channel >= 26: # GPIO number given instead of channel
+            channel -= 26
+        self.channel = channel
+
+    @classmethod
+    def load(cls, channel, values, rate=250):
+        # values can be a list of samples or the name of a capture file
+        if isinstance(values, str):
+            values = read_capture(values)
+        cls.sources[channel] = (values, rate)
+
+    def read_u16(self):
+        values, rate = ADC.sources.get(self.channel, ((32768,), 1))
+        return values[(clock.us * rate // 1000000) % len(values)]
+
+
+class Led:
+    def __init__(self, pin, mode=Pin.OUT, brightness=1):
+        self.pin = Pin(pin if isinstance(pin, int) else pin.id, Pin.OUT)
+        self.level = brightness
+
+    def on(self):
+        self.pin.on()
+
+    def off(self):
+        self.pin.off()
+
+    def toggle(self):
+        self.pin.toggle()
+
+    def value(self, v=None):
+        return self.pin.value(v)
+
+    def brightness(self, level):
+        self.level = level
+
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.freq = freq
+        self.bytes_sent = 0
+
+    def writeto(self, addr, buf):
+        self.bytes_sent += len(buf)
+
+    def writevto(self, addr, bufs):
+        for b in bufs:
+            self.bytes_sent += len(b)
+
+    def transfer_us(self, n):
+        # Time to send n bytes, 9 clocks per byte
+        return n * 9 * 1000000 // self.freq
+
+
+MONO_VLSB = 0
+
+
+class FrameBuffer:
+    # MONO_VLSB framebuffer, same layout as the SSD1306 memory: one byte is a
+    # vertical strip of 8 pixels, bytes go left to right one 8 pixel page at a
+    # time. text() draws a placeholder glyph for each character, which has the
+    # size and position of the real 8x8 font but not its shape.
+
+    def __init__(self, buffer, width, height, format=MONO_VLSB, stride=None):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.stride = stride or width
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0 if c is None else None
+        i = (y >> 3) * self.stride + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self.buffer[i] & bit else 0
+        if c:
+            self.buffer[i] |= bit
+        else:
+            self.buffer[i] &= ~bit & 0xFF
+
+    def fill(self, c):
+        v = 0xFF if c else 0
+        for i in range(len(self.buffer)):
+            self.buffer[i] = v
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(0, y), min(self.height, y + h)):
+            for xx in range(max(0, x), min(self.width, x + w)):
+                self.pixel(xx, yy, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            code = ord(ch)
+            if code != 32:
+                for col in range(7):
+                    bits = ((code * (col + 3)) ^ (code >> 1)) & 0x7F | 0x41
+                    for row in range(7):
+                        if bits & (1 << row):
+                            self.pixel(x + col, y + row, c)
+            x += 8
+
+    def scroll(self, dx, dy):
+        w = self.width
+        h = self.height
+        xs = range(w) if dx <= 0 else range(w - 1, -1, -1)
+        ys = range(h) if dy <= 0 else range(h - 1, -1, -1)
+        for y in ys:
+            for x in xs:
+                sx = x - dx
+                sy = y - dy
+                if 0 <= sx < w and 0 <= sy < h:
+                    self.pixel(x, y, self.pixel(sx, sy))
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf.height):
+            for xx in range(fbuf.width):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
+
+
+class SSD1306_I2C(FrameBuffer):
+    # Same interface as the ssd1306 driver. Commands and data go to the
+    # simulated I2C bus, which counts the bytes so display cost can be measured.
+    # The constructor runs in the same order as the real one, which ends with
+    # init_display(): the setup commands, fill(0) and show(). A subclass that
+    # overrides those sees them called before its own __init__ goes on.
+
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+        self.i2c = i2c
+        self.addr = addr
+        self.shows = 0
+        self.width = width
+        self.height = height
+        self.external_vcc = external_vcc
+        self.pages = height // 8
+        self.buffer = bytearray(self.pages * width)
+        super().__init__(self.buffer, width, height, MONO_VLSB)
+        self.init_display()
+
+    def init_display(self):
+        # Same commands as the ssd1306 driver, display off ... display on
+        for cmd in (
+            0xAE, # display off
+            0x20, 0x00, # horizontal addressing
+            0x40, # start line 0
+            0xA1, # column 127 is SEG0
+            0xA8, self.height - 1, # multiplex ratio
+            0xC8, # scan from COM[N] to COM0
+            0xD3, 0x00, # display offset
+            0xDA, 0x02 if self.width > 2 * self.height else 0x12, # COM pins
+            0xD5, 0x80, # clock divide
+            0xD9, 0x22 if self.external_vcc else 0xF1, # precharge
+            0xDB, 0x30, # VCOM deselect level
+            0x81, 0xFF, # contrast
+            0xA4, # output follows RAM
+            0xA6, # not inverted
+            0x8D, 0x10 if self.external_vcc else 0x14, # charge pump
+            0xAF, # display on
+        ):
+            self.write_cmd(cmd)
+        self.fill(0)
+        self.show()
+
+    def write_cmd(self, cmd):
+        self.i2c.writeto(self.addr, bytes((0x80, cmd)))
+
+    def write_data(self, buf):
+        self.i2c.writevto(self.addr, (b"\x40", buf))
+
+    def show(self):
+        self.shows += 1
+        self.write_cmd(0x21) # SET_COL_ADDR
+        self.write_cmd(0)
+        self.write_cmd(self.width - 1)
+        self.write_cmd(0x22) # SET_PAGE_ADDR
+        self.write_cmd(0)
+        self.write_cmd(self.pages - 1)
+        self.write_data(self.buffer)
+
+    def poweroff(self):
+        pass
+
+    def poweron(self):
+        pass
+
+    def contrast(self, contrast):
+        pass
+
+    def invert(self, invert):
+        pass
+
+    def render(self):
+        # Text picture of the screen for printing on the host
+        return "\n".join(
+            "".join("#" if self.pixel(x, y) else "." for x in range(self.width))
+            for y in range(self.height))
+
+
+class EncoderScript:
+    # Turns and presses of the rotary encoder at given virtual times.
+    # A clockwise detent is a falling edge on A while B is high.
+
+    def __init__(self, pin_a=10, pin_b=11, pin_sw=12):
+        self.pin_a = pin_a
+        self.pin_b = pin_b
+        self.pin_sw = pin_sw
+
+    def turn(self, steps, detent_ms=5):
+        # One detent every detent_ms, like a quick turn by hand
+        now = clock.ticks_ms()
+        for i in range(abs(steps)):
+            clock.call_at(now + i * detent_ms, lambda: self.detent(steps > 0))
+
+    def detent(self, clockwise):
+        drive(self.pin_b, 1 if clockwise else 0)
+        drive(self.pin_a, 0)
+        drive(self.pin_a, 1)
+        drive(self.pin_b, 1)
+
+    def press(self, hold_ms=50):
+        drive(self.pin_sw, 0)
+        clock.call_at(clock.ticks_ms() + hold_ms, lambda: drive(self.pin_sw, 1))
+
+    def at(self, ms, action, value=1):
+        # action is "turn" (value = steps, negative is counter clockwise) or "press"
+        if action == "turn":
+            return clock.call_at(ms, lambda: self.turn(value))
+        return clock.call_at(ms, lambda: self.press())
+
+
+class SimWLAN:
+    # Like network.WLAN(network.STA_IF). Joining takes join_ms of virtual
+    # time; with `available` False it never finishes.
+
+    def __init__(self, join_ms=2000, ip="192.168.8.100"):
+        self.join_ms = join_ms
+        self.ip = ip
+        self.available = True
+        self.is_active = False
+        self.joined_at = None # virtual ms when the join finishes
+        self.connects = 0
+
+    def active(self, state=None):
+        if state is None:
+            return self.is_active
+        self.is_active = bool(state)
+
+    def connect(self, ssid=None, password=None):
+        self.connects += 1
+        self.joined_at = clock.ticks_ms() + self.join_ms
+
+    def disconnect(self):
+        self.joined_at = None
+
+    def isconnected(self):
+        return (self.is_active and self.available and self.joined_at is not None
+                and clock.ticks_ms() >= self.joined_at)
+
+    def ifconfig(self):
+        return (self.ip, "255.255.255.0", "192.168.8.1", "192.168.8.1")
+
+
+class SimBroker:
+    # Keeps the published messages. Setting `up` to False makes connecting
+    # fail, drop() breaks the connections that are open.
+
+    def __init__(self):
+        self.up = True
+        self.messages = [] # (topic, message)
+        self.clients = []
+        self.connects = 0
+
+    def client(self, client_id="", server="", keepalive=0):
+        return SimMQTTClient(self, client_id)
+
+    def drop(self):
+        for c in self.clients:
+            c.alive = False
+        self.clients = []
+
+
+class SimMQTTClient:
+    def __init__(self, broker, client_id=""):
+        self.broker = broker
+        self.client_id = client_id
+        self.alive = False
+        self.pings = 0
+
+    def connect(self, clean_session=True):
+        if not self.broker.up:
+            raise OSError("ECONNREFUSED")
+        self.alive = True
+        self.broker.connects += 1
+        self.broker.clients.append(self)
+
+    def check(self):
+        if not self.alive or not self.broker.up:
+            self.alive = False
+            raise OSError("ECONNRESET")
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        self.check()
+        self.broker.messages.append((topic, msg))
+
+    def ping(self):
+        self.check()
+        self.pings += 1
+
+    def check_msg(self):
+        self.check()
+
+    def disconnect(self):
+        self.alive = False
+        if self in self.broker.clients:
+            self.broker.clients.remove(self)
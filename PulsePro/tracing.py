@@ -0,0 +1,127 @@
+from array import array
+from hal import ticks_us, ticks_diff
+
+# Timing of what the device spends its time on, for finding slow spots on the
+# Pico itself.
+# A span is (event, start, duration) in microseconds, written into three
+# preallocated arrays used as a ring, so recording one doesn't allocate and
+# can be done in an interrupt handler. When the ring is full the oldest spans
+# are overwritten. Every event also has a counter, and count() adds to one
+# without a span.
+# Tracing is off until enable(). Traced code checks `tracing.on` (one global
+# lookup) before it reads the clock, so the cost when off is that check:
+#
+#   if tracing.on:
+#       t0 = ticks_us()
+#   ...
+#   if tracing.on:
+#       tracing.span(tracing.SHOW, t0)
+#
+# dump() prints the spans and counters on the REPL, publish() sends the same
+# text over MQTT. tools/trace_hist.py makes latency histograms from it.
+# An interrupt can come between two writes of a span from the main program,
+# then one of the two spans is lost. That's the price of not disabling
+# interrupts on every span.
+
+SHOW = 0 # Display.show, sending the changed parts of the screen
+PROCESS = 1 # HeartRateDetector.process, emptying the sample Fifo
+SAMPLE = 2 # time between two sampler interrupts, only with enable(samples=True)
+STOP = 3 # HeartRateDetector.stop, stopping the sampler and the recording
+CONNECT = 4 # MQTTLink.connect
+PUBLISH = 5 # MQTTLink.publish
+WINDOW = 6 # counter: measurement windows ended
+NAMES = ("show", "process", "sample", "stop", "connect", "publish", "window")
+
+on = False
+samples = False # sampler interrupt intervals, 250 spans/s fill the ring fast
+size = 0
+events = None
+starts = None
+durations = None
+counters = array('I', bytes(4 * len(NAMES)))
+head = 0 # next slot in the ring
+total = 0 # spans since enable(), more than size: the oldest were overwritten
+
+
+def enable(ring_size=512, sample_intervals=False):
+    global on, samples, size, events, starts, durations
+    if size != ring_size:
+        size = ring_size
+        events = bytearray(ring_size)
+        starts = array('I', bytes(4 * ring_size))
+        durations = array('I', bytes(4 * ring_size))
+    clear()
+    samples = sample_intervals
+    on = True
+
+
+def disable():
+    global on, samples
+    on = False
+    samples = False
+
+
+def clear():
+    global head, total
+    head = 0
+    total = 0
+    for i in range(len(NAMES)):
+        counters[i] = 0
+
+
+def span(event, start):
+    # Records a span from start (ticks_us) to now, returns now
+    global head, total
+    now = ticks_us()
+    i = head
+    events[i] = event
+    starts[i] = start
+    durations[i] = ticks_diff(now, start)
+    head = i + 1 if i + 1 < size else 0
+    total += 1
+    counters[event] += 1
+    return now
+
+
+def count(event, n=1):
+    counters[event] += n
+
+
+def lines():
+    # Text of the spans, oldest first, and the counters: one per line
+    n = min(total, size)
+    yield "# trace %d spans, %d kept" % (total, n)
+    i = head - n
+    if i < 0:
+        i += size
+    for k in range(n):
+        yield "%s %d %d" % (NAMES[events[i]], starts[i], durations[i])
+        i = i + 1 if i + 1 < size else 0
+    for event in range(len(NAMES)):
+        yield "# count %s %d" % (NAMES[event], counters[event])
+
+
+def dump():
+    # On the REPL: import tracing; tracing.dump()
+    for line in lines():
+        print(line)
+
+
+def publish(mqtt, topic="HRV_Trace", per_message=64):
+    # Sends the dump over an MQTTLink in messages of per_message lines
+    global on
+    was_on = on
+    on = False # the dump's own messages would change the ring while it's read
+    try:
+        chunk = []
+        for line in lines():
+            chunk.append(line)
+            if len(chunk) == per_message:
+                if not mqtt.publish("\n".join(chunk), topic):
+                    return False
+                chunk = []
+        if chunk:
+            return bool(mqtt.publish("\n".join(chunk), topic))
+        return True
+    finally:
+        on = was_on
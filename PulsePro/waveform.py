@@ -0,0 +1,131 @@
+# Scrollable and zoomable PPG waveform on the OLED, for long captures
+# (capture.py). Zoom level k shows 2^k samples per pixel column as a vertical
+# bar from the smallest to the largest of them.
+#
+# The bars come from a min/max pyramid made once when the viewer is created:
+# level `base` has the min and max of every 2^base samples, already scaled to
+# the 64 rows of the screen (1 byte each), and every level above it has half
+# as many entries, the min of the mins and the max of the maxes of two. Drawing
+# any level >= base is 128 lookups. Below base the samples on screen (at most
+# 128 << base) are read from the capture. The pyramid takes about
+# 4 * samples / 2^base bytes, 37 KB for 5 min at 250 Hz with base 3. With
+# base 3 the samples for the lower levels fit in the 512 sample window of the
+# capture reader.
+# draw() only draws and sends the screen when something has changed.
+
+WIDTH = 128
+HEIGHT = 64
+
+
+class Waveform:
+    def __init__(self, oled, capture, base=3):
+        self.oled = oled
+        self.capture = capture
+        self.base = base
+        self.count = len(capture)
+        self.low, self.high = capture.min_max()
+        self.levels = {} # k -> (bytearray of mins, bytearray of maxes)
+        self.build()
+        self.zoom = 0
+        self.position = 0 # first sample on screen
+        self.changed = True
+
+    def scale(self, value):
+        span = self.high - self.low
+        if span <= 0:
+            return HEIGHT // 2
+        return (value - self.low) * (HEIGHT - 1) // span
+
+    def build(self):
+        step = 1 << self.base
+        size = (self.count + step - 1) >> self.base
+        mins = bytearray(size)
+        maxes = bytearray(size)
+        chunk = 512 // step * step # whole entries per window
+        start = 0
+        while start < self.count:
+            values = self.capture.window(start, chunk)
+            for i in range(0, len(values), step):
+                low = 0xFFFF
+                high = 0
+                for j in range(i, min(i + step, len(values))):
+                    value = values[j]
+                    if value < low:
+                        low = value
+                    if value > high:
+                        high = value
+                entry = (start + i) >> self.base
+                mins[entry] = self.scale(low)
+                maxes[entry] = self.scale(high)
+            start += len(values)
+        k = self.base
+        self.levels[k] = (mins, maxes)
+        while size > WIDTH:
+            size = (size + 1) >> 1
+            lower_mins, lower_maxes = mins, maxes
+            mins = bytearray(size)
+            maxes = bytearray(size)
+            last = len(lower_mins) - 1
+            for i in range(size):
+                a = 2 * i
+                b = min(a + 1, last)
+                mins[i] = min(lower_mins[a], lower_mins[b])
+                maxes[i] = max(lower_maxes[a], lower_maxes[b])
+            k += 1
+            self.levels[k] = (mins, maxes)
+        self.max_zoom = k # whole capture fits on the screen
+
+    def max_position(self):
+        # Positions are whole columns of the zoom level, so they line up with the pyramid
+        columns = (self.count + (1 << self.zoom) - 1) >> self.zoom
+        return max(0, columns - WIDTH) << self.zoom
+
+    def scroll(self, columns):
+        # Moves by a number of pixel columns at the current zoom level
+        position = min(self.max_position(), max(0, self.position + (columns << self.zoom)))
+        if position != self.position:
+            self.position = position
+            self.changed = True
+
+    def set_zoom(self, zoom):
+        # Keeps the sample in the middle of the screen in the middle
+        zoom = min(self.max_zoom, max(0, zoom))
+        if zoom == self.zoom:
+            return
+        middle = self.position + (WIDTH << self.zoom) // 2
+        self.zoom = zoom
+        position = (middle - (WIDTH << zoom) // 2) >> zoom << zoom
+        self.position = min(self.max_position(), max(0, position))
+        self.changed = True
+
+    def draw(self):
+        # Returns True if the screen was drawn
+        if not self.changed:
+            return False
+        self.changed = False
+        oled = self.oled
+        oled.fill(0)
+        zoom = self.zoom
+        if zoom >= self.base:
+            mins, maxes = self.levels[zoom]
+            first = self.position >> zoom
+            for x in range(min(WIDTH, len(mins) - first)):
+                low = mins[first + x]
+                oled.vline(x, HEIGHT - 1 - maxes[first + x], maxes[first + x] - low + 1, 1)
+        else:
+            step = 1 << zoom
+            values = self.capture.window(self.position, WIDTH << zoom)
+            for x in range(len(values) >> zoom):
+                low = 0xFFFF
+                high = 0
+                for j in range(x * step, x * step + step):
+                    value = values[j]
+                    if value < low:
+                        low = value
+                    if value > high:
+                        high = value
+                low = self.scale(low)
+                high = self.scale(high)
+                oled.vline(x, HEIGHT - 1 - high, high - low + 1, 1)
+        oled.show()
+        return True
@@ -0,0 +1,260 @@
+# Benchmarks for the PulsePro signal processing, run on a PC with CPython.
+#
+# Runs the heart rate and HRV code over recorded PPG captures (one value per
+# line, like capture_250Hz_01.txt) cut into windows of several lengths and
+# reports samples/s, per window latency percentiles and peak memory allocated.
+# Host times are multiplied by --slowdown to estimate the time on the RP2040
+# and every result is checked against the CPU budget of real-time sampling.
+#
+#   python3 tools/bench.py capture_250Hz_01.txt
+#   python3 tools/bench.py capture_250Hz_01.txt -i batch -i stream -w 4 -w 30
+#   python3 tools/bench.py capture_250Hz_01.txt --save before.json
+#   python3 tools/bench.py capture_250Hz_01.txt --baseline before.json
+#
+# Exit status is 1 if any result is over budget or slower than the baseline.
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "PulsePro"), os.path.join(ROOT, "pico-test", "lib")]
+
+import sim
+from hal import ADC, I2C, SSD1306_I2C
+from sampler import Sampler
+from heart_rate import HeartRateDetector
+from peak_detector import PeakDetector
+from filters import SignalFilter
+from hrv import HRVData, HRVAccumulator
+from freq import FrequencyHRV
+from ppi import PPIStore
+from fixedpoint import div_round
+
+RATE = 250
+
+
+def make_detector():
+    oled = SSD1306_I2C(128, 64, I2C(1))
+    return HeartRateDetector(oled, Sampler(ADC(0), RATE), PPIStore(RATE), HRVAccumulator())
+
+
+# Each benchmark gets one window of samples and returns its result. The input
+# of the HRV benchmarks is the list of intervals (ms) of the window instead.
+
+def bench_threshold(hr, window):
+    return hr.calculate_threshold(window)
+
+
+def bench_detect_peaks(hr, window):
+    return hr.detect_peaks(window)
+
+
+def bench_batch(hr, window):
+    return hr.calculate_heart_rate(window)
+
+
+def bench_stream(hr, window):
+    signal_filter = hr.filter
+    detector = hr.detector
+    signal_filter.reset()
+    detector.reset()
+    first = last = -1
+    count = 0
+    for value in window:
+        peak = detector.add(signal_filter.add(value))
+        if peak >= 0:
+            if first < 0:
+                first = peak
+            last = peak
+            count += 1
+    if count < 2:
+        return None
+    return div_round(60 * RATE * (count - 1), last - first)
+
+
+def bench_hrv_batch(hrv, intervals):
+    mean_ppi = hrv.meanPPI_calculator(intervals)
+    return (mean_ppi, hrv.meanHR_calculator(mean_ppi),
+            hrv.SDNN_calculator(intervals, mean_ppi), hrv.RMSSD_calculator(intervals))
+
+
+def bench_hrv_stream(stats, intervals):
+    stats.reset()
+    for ppi in intervals:
+        stats.add(ppi)
+    return stats.snapshot()
+
+
+def bench_hrv_freq(freq, intervals):
+    return freq.analyse(intervals)
+
+
+# name -> (function, object factory, input is intervals)
+BENCHMARKS = {
+    "threshold": (bench_threshold, make_detector, False),
+    "detect_peaks": (bench_detect_peaks, make_detector, False),
+    "batch": (bench_batch, make_detector, False),
+    "stream": (bench_stream, make_detector, False),
+    "hrv-batch": (bench_hrv_batch, lambda: HRVData(None), True),
+    "hrv-stream": (bench_hrv_stream, HRVAccumulator, True),
+    "hrv-freq": (bench_hrv_freq, FrequencyHRV, True),
+}
+
+# Shorter windows only time an early return: FrequencyHRV needs freq.MIN_SIZE
+# resampled values (32 s of beats), 64 s windows have them with room to spare
+MIN_WINDOW_S = {"hrv-freq": 64}
+
+
+def find_intervals(samples):
+    # Reference intervals for the HRV benchmarks: (peak index, interval ms)
+    signal_filter = SignalFilter()
+    detector = PeakDetector(RATE)
+    store = PPIStore(RATE, capacity=len(samples) // (RATE // 4) + 1)
+    intervals = []
+    for value in samples:
+        peak = detector.add(signal_filter.add(value))
+        if peak >= 0:
+            ms = store.add_peak(peak)
+            if ms:
+                intervals.append((peak, ms))
+    return intervals
+
+
+def make_windows(samples, intervals, window_s, use_intervals):
+    size = window_s * RATE
+    windows = []
+    for start in range(0, len(samples) - size + 1, size):
+        if use_intervals:
+            window = [ms for index, ms in intervals if start <= index < start + size]
+            if len(window) > 2:
+                windows.append(window)
+        else:
+            windows.append(samples[start:start + size])
+    return windows
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(name, captures, window_s, repeat):
+    func, factory, use_intervals = BENCHMARKS[name]
+    windows = []
+    for samples, intervals in captures:
+        windows += make_windows(samples, intervals, window_s, use_intervals)
+    if not windows:
+        return None
+    obj = factory()
+
+    times = []
+    for i in range(repeat):
+        for window in windows:
+            t0 = time.perf_counter()
+            func(obj, window)
+            times.append(time.perf_counter() - t0)
+
+    # Separate run for memory, tracemalloc slows everything down
+    tracemalloc.start()
+    for window in windows:
+        tracemalloc.reset_peak()
+        func(obj, window)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    n_samples = len(windows) * window_s * RATE * repeat
+    return {
+        "impl": name,
+        "window_s": window_s,
+        "windows": len(windows),
+        "samples_per_s": n_samples / sum(times),
+        "p50_ms": percentile(times, 50) * 1000,
+        "p90_ms": percentile(times, 90) * 1000,
+        "p99_ms": percentile(times, 99) * 1000,
+        "peak_alloc_kb": peak / 1024,
+    }
+
+
+def check(result, args, baseline):
+    # Load on the RP2040 = estimated processing time / time the window covers
+    result["device_load"] = RATE * args.slowdown / result["samples_per_s"]
+    problems = []
+    if result["device_load"] > args.budget:
+        problems.append("over budget")
+    key = "%s/%d" % (result["impl"], result["window_s"])
+    old = baseline.get(key)
+    if old and result["samples_per_s"] < old["samples_per_s"] * (1 - args.tolerance):
+        problems.append("%.0f%% slower than baseline" %
+                        (100 * (1 - result["samples_per_s"] / old["samples_per_s"])))
+    result["problems"] = problems
+    return key
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PulsePro signal path")
+    parser.add_argument("captures", nargs="+", help="capture files, one ADC value per line")
+    parser.add_argument("-i", "--impl", action="append", choices=sorted(BENCHMARKS),
+                        help="benchmarks to run, first one is the reference for the ratio column (default: all)")
+    parser.add_argument("-w", "--window", action="append", type=int,
+                        help="window length in seconds (default: 4 10 30 64 300)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="times to run every window")
+    parser.add_argument("--slowdown", type=float, default=200,
+                        help="how many times slower MicroPython on the RP2040 is than this host")
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="max. part of the RP2040 CPU the signal path may use")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline before it is a regression")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from an earlier --save to compare against")
+    args = parser.parse_args()
+
+    names = args.impl or list(BENCHMARKS)
+    window_sizes = args.window or [4, 10, 30, 64, 300]
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    captures = []
+    for name in args.captures:
+        samples = sim.read_capture(name)
+        captures.append((samples, find_intervals(samples)))
+
+    results = {}
+    failed = False
+    print("%-13s %5s %7s %12s %9s %9s %9s %9s %7s %6s" % (
+        "impl", "win s", "windows", "samples/s", "p50 ms", "p90 ms", "p99 ms",
+        "alloc KB", "load", "ratio"))
+    for window_s in window_sizes:
+        reference = None
+        for name in names:
+            if window_s < MIN_WINDOW_S.get(name, 0):
+                print("%-13s %5d   n/a, needs windows of %d s or more" % (name, window_s, MIN_WINDOW_S[name]))
+                continue
+            result = run(name, captures, window_s, args.repeat)
+            if result is None:
+                print("%-13s %5d   capture too short" % (name, window_s))
+                continue
+            key = check(result, args, baseline)
+            results[key] = result
+            if reference is None:
+                reference = result["samples_per_s"]
+            print("%-13s %5d %7d %12.0f %9.3f %9.3f %9.3f %9.1f %6.1f%% %5.2fx %s" % (
+                name, window_s, result["windows"], result["samples_per_s"],
+                result["p50_ms"], result["p90_ms"], result["p99_ms"],
+                result["peak_alloc_kb"], 100 * result["device_load"],
+                result["samples_per_s"] / reference, ", ".join(result["problems"])))
+            failed = failed or bool(result["problems"])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# Precompiles PulsePro to .mpy bytecode and copies it to the Pico.
+#
+# Modules copied as .py files are compiled from source every time they're
+# imported, which is most of the time from reset to the menu and leaves the
+# compiler's garbage on the heap. .mpy files are loaded as they are.
+#
+#   pip install mpy-cross   (same MicroPython version as the firmware)
+#   python3 tools/build_mpy.py              # build/pico/*.mpy and main.py
+#   python3 tools/build_mpy.py --deploy     # and copy them to the Pico
+#   python3 tools/build_mpy.py --lib pico-test/lib --deploy
+#
+# main.py stays a .py file (MicroPython only runs main.py from source) and
+# only imports device. sim.py is left out, it's only used on a PC. The Pico
+# imports a .py file before a .mpy file of the same name, so --deploy removes
+# the .py versions of the compiled modules from the Pico.
+# After deploying, the boot report of device.py (BOOT_REPORT) shows the time
+# from reset to the menu and the heap use, compare it with the .py version:
+#
+#   mpremote reset && mpremote repl
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, "PulsePro")
+SKIP = ("main.py", "sim.py")
+ARCH = "armv6m" # RP2040, needed for the viper kernels
+
+
+def mpy_cross():
+    # The mpy-cross program, or the one from the mpy-cross pip package
+    path = shutil.which("mpy-cross")
+    if path:
+        return [path]
+    try:
+        import mpy_cross
+    except ImportError:
+        sys.exit("mpy-cross not found, install it with: pip install mpy-cross")
+    return [sys.executable, "-m", "mpy_cross"]
+
+
+def compile_dir(compiler, source, out, skip=()):
+    os.makedirs(out, exist_ok=True)
+    names = []
+    for path in sorted(glob.glob(os.path.join(source, "*.py"))):
+        name = os.path.basename(path)
+        if name in skip:
+            continue
+        target = os.path.join(out, name[:-3] + ".mpy")
+        subprocess.run(compiler + ["-march=" + ARCH, "-o", target, path], check=True)
+        names.append(name)
+    return names
+
+
+def deploy(out, names, lib_names):
+    # Removes the .py files that would be imported instead, then copies everything
+    stale = names + ["lib/" + name for name in lib_names]
+    code = "import os\nfor n in %r:\n try: os.remove(n)\n except OSError: pass\n" % stale
+    subprocess.run(["mpremote", "exec", code], check=True)
+    files = sorted(glob.glob(os.path.join(out, "*.mpy"))) + [os.path.join(out, "main.py")]
+    subprocess.run(["mpremote", "cp"] + files + [":"], check=True)
+    lib_files = sorted(glob.glob(os.path.join(out, "lib", "*.mpy")))
+    if lib_files:
+        subprocess.run(["mpremote", "mkdir", ":lib"], check=False)
+        subprocess.run(["mpremote", "cp"] + lib_files + [":lib/"], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build PulsePro .mpy files")
+    parser.add_argument("-o", "--out", default=os.path.join(ROOT, "build", "pico"))
+    parser.add_argument("--lib", help="also compile the libraries in this folder (pico-test/lib) to lib/")
+    parser.add_argument("--deploy", action="store_true", help="copy the result to the Pico with mpremote")
+    args = parser.parse_args()
+
+    compiler = mpy_cross()
+    names = compile_dir(compiler, SOURCE, args.out, SKIP)
+    shutil.copy(os.path.join(SOURCE, "main.py"), os.path.join(args.out, "main.py"))
+    lib_names = []
+    if args.lib:
+        lib_names = compile_dir(compiler, args.lib, os.path.join(args.out, "lib"))
+    size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(args.out, "**", "*.mpy"), recursive=True))
+    print("%d modules, %d bytes of .mpy in %s" % (len(names) + len(lib_names), size, args.out))
+    if args.deploy:
+        deploy(args.out, names, lib_names)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+# Checks the integer signal math against the float versions it replaced.
+#
+# The tolerances in the header of PulsePro/fixedpoint.py are checked here on
+# random data and, when captures are given, on their samples and the
+# intervals the streaming detector finds in them:
+#
+#   python3 tools/fixedpoint_check.py
+#   python3 tools/fixedpoint_check.py capture_250Hz_01.txt capture_250Hz_02.txt
+#
+# The HRV values are checked both from the HRVData calculators (batch) and
+# from HRVAccumulator.snapshot() (streaming). Exit status is 1 if any value is
+# outside its tolerance.
+
+import argparse
+import math
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "PulsePro"), os.path.join(ROOT, "pico-test", "lib")]
+
+import sim
+from hal import ADC, I2C, SSD1306_I2C
+from sampler import Sampler
+from heart_rate import HeartRateDetector
+from peak_detector import PeakDetector
+from filters import SignalFilter
+from hrv import HRVData, HRVAccumulator
+from ppi import PPIStore
+
+RATE = 250
+RANDOM_CASES = 200
+
+# value -> largest allowed difference from the float version
+TOLERANCE = {
+    "mean_ppi": 1,
+    "mean_hr": 1,
+    "pnn50": 1,
+    "sdnn": 1,
+    "rmssd": 1,
+    "threshold": 16,
+}
+
+
+# Float versions, the way the code computed them before fixedpoint.py
+
+def float_threshold(samples):
+    mean = sum(samples) / len(samples)
+    return mean + math.sqrt(sum((x - mean) ** 2 for x in samples) / len(samples))
+
+
+def float_hrv(intervals):
+    n = len(intervals)
+    mean = sum(intervals) / n
+    diffs = [intervals[i + 1] - intervals[i] for i in range(n - 1)]
+    return {
+        "mean_ppi": mean,
+        "mean_hr": 60 * 1000 / mean,
+        "sdnn": math.sqrt(sum((x - mean) ** 2 for x in intervals) / (n - 1)),
+        "rmssd": math.sqrt(sum(d * d for d in diffs) / (n - 1)),
+        "pnn50": 100 * sum(1 for d in diffs if abs(d) > 50) / (n - 1),
+    }
+
+
+def batch_hrv(intervals):
+    hrv = HRVData(None)
+    mean_ppi = hrv.meanPPI_calculator(intervals)
+    return {
+        "mean_ppi": mean_ppi,
+        "mean_hr": hrv.meanHR_calculator(mean_ppi),
+        "sdnn": hrv.SDNN_calculator(intervals, mean_ppi),
+        "rmssd": hrv.RMSSD_calculator(intervals),
+    }
+
+
+def stream_hrv(intervals):
+    stats = HRVAccumulator()
+    for ppi in intervals:
+        stats.add(ppi)
+    return stats.snapshot()
+
+
+def find_intervals(samples):
+    signal_filter = SignalFilter()
+    detector = PeakDetector(RATE)
+    store = PPIStore(RATE, capacity=len(samples) // (RATE // 4) + 1)
+    for value in samples:
+        peak = detector.add(signal_filter.add(value))
+        if peak >= 0:
+            store.add_peak(peak)
+    return list(store.values())
+
+
+def random_intervals():
+    n = random.randint(3, 400)
+    level = random.randint(500, 1300)
+    return [min(2000, max(250, level + random.randint(-150, 150))) for i in range(n)]
+
+
+def random_samples():
+    # PPG like: slow wave plus noise, raw read_u16() scale
+    level = 30000
+    samples = []
+    for i in range(random.randint(16, 2500)):
+        level += random.randint(-300, 300)
+        level = min(60000, max(2000, level))
+        samples.append(level)
+    return samples
+
+
+class Checker:
+    def __init__(self):
+        self.worst = {} # (value, version) -> largest difference seen
+        self.problems = 0
+
+    def compare(self, source, version, values, reference):
+        for key, value in values.items():
+            if key not in reference:
+                continue
+            diff = abs(value - reference[key])
+            worst = self.worst.get((key, version), 0)
+            self.worst[(key, version)] = max(worst, diff)
+            if diff > TOLERANCE[key]:
+                print("OUT OF TOLERANCE: %s %s %s %d, float %.2f" % (source, version, key, value, reference[key]))
+                self.problems += 1
+
+    def hrv(self, source, intervals):
+        reference = float_hrv(intervals)
+        self.compare(source, "batch", batch_hrv(intervals), reference)
+        self.compare(source, "stream", stream_hrv(intervals), reference)
+
+    def threshold(self, source, hr, samples):
+        self.compare(source, "batch", {"threshold": hr.calculate_threshold(samples)},
+                     {"threshold": float_threshold(samples)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the integer HRV and threshold math against floats")
+    parser.add_argument("captures", nargs="*", help="capture files, one ADC value per line")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    hr = HeartRateDetector(SSD1306_I2C(128, 64, I2C(1)), Sampler(ADC(0), RATE), PPIStore(RATE), HRVAccumulator())
+    checker = Checker()
+    for i in range(RANDOM_CASES):
+        checker.hrv("random", random_intervals())
+        checker.threshold("random", hr, random_samples())
+    for name in args.captures:
+        samples = sim.read_capture(name)
+        for start in range(0, len(samples) - 975 + 1, 975): # 3.9 s windows, like the old measurement
+            checker.threshold(name, hr, samples[start:start + 975])
+        intervals = find_intervals(samples)
+        if len(intervals) > 2:
+            checker.hrv(name, intervals)
+
+    print("%-10s %-7s %6s %9s" % ("value", "version", "worst", "tolerance"))
+    for (key, version), worst in sorted(checker.worst.items()):
+        print("%-10s %-7s %6.2f %9d" % (key, version, worst, TOLERANCE[key]))
+    print("all within tolerance" if not checker.problems else "%d values out of tolerance" % checker.problems)
+    return 1 if checker.problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# Checks the kernels in PulsePro/kernels.py and reports their speed.
+#
+# On the Pico the viper kernels are compared with the plain Python versions
+# on random data, and the time of both is printed with the speedup:
+#
+#   mpremote cp PulsePro/kernels.py PulsePro/kernels_viper.py :
+#   mpremote run tools/kernels_check.py
+#
+# On a PC only the Python versions exist, they are compared with the simple
+# list code that the kernels replaced:
+#
+#   python3 tools/kernels_check.py
+#
+# Exit status is 1 if any result differs.
+
+import sys
+import random
+
+try:
+    import os
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path[:0] = [os.path.join(ROOT, "PulsePro")]
+except (AttributeError, NameError):
+    pass # MicroPython, the PulsePro files are on the device
+
+from array import array
+import kernels
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+SIZES = (16, 250, 975, 2500)
+REPEAT = 5
+
+
+# Reference results, the way the list code computed them
+
+def ref_total(values, start, end, shift):
+    return sum(x >> shift for x in values[start:end])
+
+
+def ref_squares(values, start, end, shift, mean):
+    return sum(((x >> shift) - mean) ** 2 for x in values[start:end])
+
+
+def ref_diff_squares(values, start, end):
+    return sum((values[i + 1] - values[i]) ** 2 for i in range(start, end - 1))
+
+
+def ref_maxima(values, start, end, threshold, out, count, size):
+    for i in range(start, end):
+        if values[i - 1] < values[i] > values[i + 1] and values[i] > threshold and count < size:
+            out[count] = i
+            count += 1
+    return count
+
+
+def make_samples(n):
+    # PPG like: slow wave plus noise, raw read_u16() scale
+    values = array('H')
+    level = 30000
+    for i in range(n):
+        level += random.randint(-300, 300)
+        level = min(60000, max(2000, level))
+        values.append(level)
+    return values
+
+
+def make_intervals(n):
+    return array('H', [random.randint(400, 1500) for i in range(n)])
+
+
+def cases(n):
+    # (name, compiled function, python function, buffer, extra arguments)
+    samples = make_samples(n)
+    intervals = make_intervals(n)
+    threshold = sum(samples) // n
+    return [
+        ("total", kernels.total_range, kernels.py_total_range, samples, (4,)),
+        ("squares", kernels.squares_range, kernels.py_squares_range, samples, (4, threshold >> 4)),
+        ("diff_squares", kernels.diff_squares_range, kernels.py_diff_squares_range, intervals, ()),
+        ("maxima", kernels.maxima_range, kernels.py_maxima_range, samples, (threshold,)),
+    ]
+
+
+def call(function, name, buf, n, extra, out):
+    # Runs one kernel over the whole buffer, in chunks like kernels.py does
+    if name == "maxima":
+        return function(buf, 1, n - 1, extra[0], out, 0, len(out))
+    result = 0
+    for start in range(0, n, kernels.CHUNK):
+        result += function(buf, start, min(n, start + kernels.CHUNK), *extra)
+    return result
+
+
+def timed(function, name, buf, n, extra, out):
+    best = None
+    for i in range(REPEAT):
+        start = ticks_us()
+        call(function, name, buf, n, extra, out)
+        used = ticks_diff(ticks_us(), start)
+        if best is None or used < best:
+            best = used
+    return best
+
+
+def main():
+    problems = 0
+    if kernels.COMPILED:
+        print("comparing viper kernels with the Python versions")
+    else:
+        print("viper kernels not available, comparing the Python versions with the list code")
+    print("{:14}{:>6}{:>12}{:>12}{:>9}".format("kernel", "n", "python us", "kernel us", "speedup"))
+    for n in SIZES:
+        for name, compiled, python, buf, extra in cases(n):
+            other = compiled if kernels.COMPILED else {
+                "total": ref_total, "squares": ref_squares,
+                "diff_squares": ref_diff_squares, "maxima": ref_maxima}[name]
+            other_buf = buf if kernels.COMPILED else list(buf)
+            out1 = array('I', bytes(4 * n))
+            out2 = array('I', bytes(4 * n))
+            a = call(python, name, buf, n, extra, out1)
+            b = call(other, name, other_buf, n, extra, out2)
+            if a != b or (name == "maxima" and out1[:a] != out2[:b]):
+                print("DIFFERENT:", name, n, a, b)
+                problems += 1
+            t_python = timed(python, name, buf, n, extra, out1)
+            if kernels.COMPILED:
+                t_kernel = timed(compiled, name, buf, n, extra, out2)
+                speedup = "{:.1f}x".format(t_python / max(1, t_kernel))
+            else:
+                t_kernel = "-"
+                speedup = "-"
+            print("{:14}{:>6}{:>12}{:>12}{:>9}".format(name, n, t_python, t_kernel, speedup))
+
+    # The chunked wrappers against the reference on whole buffers
+    for n in SIZES:
+        samples = make_samples(n)
+        intervals = make_intervals(n)
+        mean = sum(x >> 4 for x in samples) // n
+        checks = [
+            ("total()", kernels.total(samples, n, 4), ref_total(list(samples), 0, n, 4)),
+            ("squares()", kernels.squares(samples, n, mean, 4), ref_squares(list(samples), 0, n, 4, mean)),
+            ("diff_squares()", kernels.diff_squares(intervals, n), ref_diff_squares(list(intervals), 0, n)),
+        ]
+        for name, a, b in checks:
+            if a != b:
+                print("DIFFERENT:", name, n, a, b)
+                problems += 1
+    print("all results equal" if not problems else "{} results differ".format(problems))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
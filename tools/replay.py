@@ -0,0 +1,75 @@
+# Replays PulsePro recordings (rec/*.ppg, see PulsePro/recording.py) on a PC.
+#
+# Copy the recordings from the Pico (mpremote cp -r :rec .) and run them
+# through the same filter, peak detector and HRV code as on the device:
+#
+#   python3 tools/replay.py rec/0001.ppg rec/0002.ppg
+#   python3 tools/replay.py rec/0001.ppg --text capture.txt
+#
+# --text also writes the samples one per line, the format of the
+# capture_250Hz files, for Filefifo and sim.ADC.load().
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "PulsePro"), os.path.join(ROOT, "pico-test", "lib")]
+
+from hal import I2C, SSD1306_I2C
+from heart_rate import HeartRateDetector
+from hrv import HRVAccumulator
+from ppi import PPIStore
+from recording import Replay, read_header
+
+
+def analyse(name):
+    source = Replay(name, paced=False)
+    ppi = PPIStore(source.rate, capacity=source.count // (source.rate // 4) + 1)
+    stats = HRVAccumulator()
+    hr = HeartRateDetector(SSD1306_I2C(128, 64, I2C(1)), source, ppi, stats)
+    hr.start()
+    while source.has_data():
+        hr.process()
+    hr.stop()
+    result = stats.snapshot()
+    if hr.first_bpm >= 0:
+        result["first_bpm_ms"] = hr.first_bpm * 1000 // source.rate # time to the first BPM
+    return result
+
+
+def write_text(name, text_name):
+    source = Replay(name, paced=False)
+    source.start()
+    with open(text_name, "w") as f:
+        while source.has_data():
+            value = source.get()
+            if value is None:
+                break
+            f.write("%d\n" % value)
+    source.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay PulsePro recordings")
+    parser.add_argument("recordings", nargs="+")
+    parser.add_argument("--text", help="write the samples of the (last) recording to this file")
+    args = parser.parse_args()
+
+    for name in args.recordings:
+        try:
+            info = read_header(name)
+        except (OSError, ValueError) as e:
+            print(name, e)
+            return 1
+        print("%s: %d samples at %d Hz, %.1f s, started at %d, %d filled in for missed interrupts" % (
+            name, info["count"], info["rate"], info["duration_ms"] / 1000, info["start_time"], info["filled"]))
+        result = analyse(name)
+        print("  " + ", ".join("%s %d" % (key, value) for key, value in result.items()))
+    if args.text:
+        write_text(args.recordings[-1], args.text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# Latency histograms from PulsePro trace dumps (see PulsePro/tracing.py).
+#
+# Save a dump from the REPL (tracing.dump()) or from MQTT, where device.py
+# sends it after every result when TRACE = True:
+#
+#   mosquitto_sub -h 192.168.8.253 -t HRV_Trace > trace.txt
+#   python3 tools/trace_hist.py trace.txt
+#   python3 tools/trace_hist.py trace.txt -e show -e sample
+#
+# For every event: count, min, median, 90th/99th percentile and max in
+# microseconds, and a histogram with power of 2 buckets. Counter lines of the
+# dumps are added up over all the dumps.
+
+import argparse
+import sys
+
+
+def read_dumps(names):
+    spans = {} # event -> durations in us
+    counters = {}
+    for name in names:
+        with open(name) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 4 and fields[:2] == ["#", "count"]:
+                    counters[fields[2]] = counters.get(fields[2], 0) + int(fields[3])
+                elif len(fields) == 3 and not line.startswith("#"):
+                    spans.setdefault(fields[0], []).append(int(fields[2]))
+    return spans, counters
+
+
+def percentile(values, p):
+    # values sorted, nearest rank
+    return values[min(len(values) - 1, max(0, (len(values) * p + 99) // 100 - 1))]
+
+
+def histogram(values, width=40):
+    buckets = {}
+    for value in values:
+        bucket = max(value, 1).bit_length() - 1 # 2^k .. 2^(k+1) - 1
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    most = max(buckets.values())
+    rows = []
+    for k in range(min(buckets), max(buckets) + 1):
+        n = buckets.get(k, 0)
+        low = 0 if k == 0 else 1 << k
+        rows.append("  %8d-%-8d us %s %d" % (low, (2 << k) - 1, "#" * ((n * width + most - 1) // most), n))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency histograms from PulsePro trace dumps")
+    parser.add_argument("dumps", nargs="+")
+    parser.add_argument("-e", "--event", action="append", help="only this event, can be repeated")
+    parser.add_argument("--width", type=int, default=40, help="length of the longest bar")
+    args = parser.parse_args()
+
+    spans, counters = read_dumps(args.dumps)
+    if not spans and not counters:
+        print("no trace lines found")
+        return 1
+    for event in sorted(spans):
+        if args.event and event not in args.event:
+            continue
+        values = sorted(spans[event])
+        print("%s: %d spans, min %d, median %d, p90 %d, p99 %d, max %d us" % (
+            event, len(values), values[0], percentile(values, 50), percentile(values, 90),
+            percentile(values, 99), values[-1]))
+        for row in histogram(values, args.width):
+            print(row)
+    if counters and not args.event:
+        print("counters: " + ", ".join("%s %d" % item for item in sorted(counters.items()) if item[1]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())